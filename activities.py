@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+
+
+"""
+CPU activity model: how much CPU each activity (prompt reconstruction, re-reconstruction, MC, analysis) needs
+
+general pattern:
+ _required: HS06
+ _time: HS06s
+
+The activities are formulas in activity_model over the per year series of cpu_series (events, CPU time per event,
+shutdown and new detector flags) and named constants. The default ones encode:
+ Prompt Data: reconstruction as quickly as the data is recorded, plus 50% for express, repacking, AlCa, CAF and
+              skimming (prompt_overhead)
+ Non-Prompt Data: re-reconstruct 25% of the data within a month, and the previous year's data (as many events)
+                  within three months
+ LHC MC, HL-LHC MC: spread over the year, or half of it in a year with new detectors in the current era
+ Analysis: 75% of everything else. Up to HL-LHC it grows with the accumulated data instead (analysis_growth,
+           chained from the year before), with the HS06 needed over the whole year
+ First year of a shutdown: re-reconstruct three years of data and redo three years of LHC MC over the year
+
+All the series are numpy arrays by year, with year as the last axis. Any leading axes are batch dimensions from
+model parameters given as arrays (see derivatives.py).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+from configure import in_shutdown, mc_event_model, model_years, run_model
+from formulas import compiled
+from labeled import LabeledArray, stack_trailing
+from performance import performance_by_year
+
+SECONDS_PER_YEAR = 86400 * 365
+SECONDS_PER_MONTH = 86400 * 30
+RUNNING_TIME = 7.8E06
+
+
+def sim_time(model, year, kind):
+    """
+    :return: CPU time per event for GENSIM + DIGI + RECO of one kind of MC
+    """
+
+    return sum(performance_by_year(model, year, tier, data_type='mc', kind=kind)[0]
+               for tier in ['GENSIM', 'DIGI', 'RECO'])
+
+
+def cpu_series(model, years=None):
+    """
+    The per year inputs to the CPU model
+
+    :param model: The configuration dictionary
+    :param years: Years to consider, defaults to start_year through end_year
+    :return: dictionary of name: numpy array by year
+    """
+
+    years = years or model_years(model)
+    mcEvents = [mc_event_model(model, year) for year in years]
+
+    series = {
+        'year': np.array(years),
+        # Get the performance year by year which includes the software improvement factor
+        'reco_time': stack_trailing([performance_by_year(model, year, 'RECO', data_type='data')[0]
+                                     for year in years]),
+        'lhc_sim_time': stack_trailing([sim_time(model, year, '2017') for year in years]),
+        'hllhc_sim_time': stack_trailing([sim_time(model, year, '2026') for year in years]),
+        # Take the running time and event rate from the model
+        'data_events': stack_trailing([run_model(model, year, data_type='data').events for year in years]),
+        'lhc_mc_events': stack_trailing([events['2017'] for events in mcEvents]),
+        'hllhc_mc_events': stack_trailing([events['2026'] for events in mcEvents]),
+        'in_shutdown': np.array([in_shutdown(model, year)[0] for year in years]),
+        'first_shutdown_year': np.array([in_shutdown(model, year)[0] and not in_shutdown(model, year - 1)[0]
+                                         for year in years]),
+        'new_detector_year': np.array([year in model['new_detector_years'] for year in years]),
+    }
+    return series
+
+
+def cpu_requirements(model, years=None, series=None):
+    """
+    Evaluate the activity formulas of activity_model (compiled once by formulas.py) on the series of cpu_series
+
+    :param model: The configuration dictionary
+    :param years: Years to consider, defaults to start_year through end_year
+    :param series: cpu_series of the model for these years, if already computed
+    :return: LabeledArrays by year and activity of CPU required (HS06) and CPU time (HS06 * s)
+    """
+
+    years = years or model_years(model)
+    activityModel = model['activity_model']
+    series = dict(series or cpu_series(model, years))
+    series['first_year'] = np.arange(len(years)) == 0
+
+    constants = dict(activityModel['constants'], SECONDS_PER_YEAR=SECONDS_PER_YEAR,
+                     SECONDS_PER_MONTH=SECONDS_PER_MONTH, RUNNING_TIME=RUNNING_TIME)
+    for name, value in constants.items():
+        if np.ndim(value):  # A batch of values, put it in front of the year axis
+            constants[name] = np.asarray(value)[..., np.newaxis]
+    plan = compiled(activityModel['formulas'], list(series.keys()), constants)
+    activities = activityModel['activities']
+    results = plan.evaluate(series, list(years), [activity[kind] for activity in activities
+                                                  for kind in ['required', 'time']], constants)
+
+    axes = [('year', years), ('activity', [activity['name'] for activity in activities])]
+    required = LabeledArray(axes, stack_trailing([results[activity['required']] for activity in activities]))
+    time = LabeledArray(axes, stack_trailing([results[activity['time']] for activity in activities]))
+    return required, time
@@ -0,0 +1,295 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./archive.py add config1.json,...,configN.json --scenario NAME [--date YYYY-MM-DD] [--archive DIR]
+       ./archive.py list [--scenario NAME] [--since DATE] [--until DATE] [--where key=value ...]
+       ./archive.py query METRIC [--year YEAR] [same filters as list]
+
+Append-only archive of projection runs, so past planning rounds can be compared without re-running them.
+
+ DIR/runs.jsonl: the index, one line per run with its number, scenario name, date, the hash of the merged
+                 configuration and where its rows start
+ DIR/configs/HASH.json: the merged configuration, stored once per distinct hash
+ DIR/parameters/KEY.txt: the hashes of the configurations with one configuration key and value (KEY is the sha1 of
+                         the pair), written when a configuration is first stored. Filters on configuration keys read
+                         one of these small files per key instead of the configurations. DIR/parameters/indexed.txt
+                         lists the hashes indexed, the others (archives from before) are indexed on the first filter.
+ DIR/COLUMN.bin: one flat binary column per field (run, year and the metrics of projection.py), a row per run and
+                 year, read back as numpy memory maps
+
+Runs are filtered on the index, which is small, and the metric columns are masked on the memory maps, so queries
+across every archived run do not parse or re-run anything. Rows are appended before the index line that makes them
+visible; anything written past the last indexed row (an interrupted append) is dropped by the next append.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+from configure import configure, parameter_name
+from projection import METRICS, evaluate
+
+COLUMNS = [('run', np.int32), ('year', np.int16)] + [(metric, np.float64) for metric in METRICS]
+
+
+def config_hash(model):
+    """
+    :return: sha1 of the configuration written as canonical JSON
+    """
+
+    return hashlib.sha1(json.dumps(model, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def parameter_key(key, value):
+    """
+    :return: sha1 of a '/' separated configuration key and its value, numbers compared as floats
+    """
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = float(value)
+    return hashlib.sha1(json.dumps([key, value], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def flatten(value, path=()):
+    """
+    :return: dictionary of '/' separated key: value for every number, string and boolean in a configuration
+    """
+
+    flat = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flat.update(flatten(item, path + (key,)))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            flat.update(flatten(item, path + (index,)))
+    else:
+        flat[parameter_name(path)] = value
+    return flat
+
+
+class Archive(object):
+    """
+    An archive directory, created if it does not exist
+
+    :param directory: where the index and the columns are kept
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        for subdirectory in ['configs', 'parameters']:
+            if not os.path.isdir(os.path.join(directory, subdirectory)):
+                os.makedirs(os.path.join(directory, subdirectory))
+        self.runs = []
+        indexPath = os.path.join(directory, 'runs.jsonl')
+        if os.path.exists(indexPath):
+            with open(indexPath, 'r') as indexFile:
+                self.runs = [json.loads(line) for line in indexFile if line.strip()]
+        self._columns = None
+        self._indexed = None
+
+    @property
+    def n_rows(self):
+        return sum(run['rows'] for run in self.runs)
+
+    def _column_path(self, name):
+        return os.path.join(self.directory, name + '.bin')
+
+    def columns(self):
+        """
+        :return: dictionary of column name: read only numpy memory map, limited to the indexed rows
+        """
+
+        if self._columns is None:
+            nRows = self.n_rows
+            self._columns = {}
+            for name, dtype in COLUMNS:
+                if nRows:
+                    self._columns[name] = np.memmap(self._column_path(name), dtype=dtype, mode='r', shape=(nRows,))
+                else:
+                    self._columns[name] = np.zeros(0, dtype=dtype)
+        return self._columns
+
+    def append(self, model, results, scenario, date=None, metadata=None):
+        """
+        :param model: The merged configuration dictionary
+        :param results: LabeledArray by year and metric from projection.evaluate
+        :param scenario: name of the scenario
+        :param date: ISO date (YYYY-MM-DD) of the run, defaults to today
+        :param metadata: optional JSON serializable dictionary kept in the index
+        :return: the run number
+        """
+
+        nRows = self.n_rows
+        runNumber = len(self.runs)
+        years = results.labels[results.axis('year')]
+        values = {'run': np.full(len(years), runNumber), 'year': np.array(years)}
+        for metric in METRICS:
+            values[metric] = results.select(metric=metric).values
+
+        for name, dtype in COLUMNS:
+            with open(self._column_path(name), 'ab') as columnFile:
+                columnFile.truncate(nRows * np.dtype(dtype).itemsize)
+                np.asarray(values[name], dtype=dtype).tofile(columnFile)
+
+        digest = config_hash(model)
+        configPath = os.path.join(self.directory, 'configs', digest + '.json')
+        if not os.path.exists(configPath):
+            self._index_parameters(digest, json.loads(json.dumps(model)))
+            with open(configPath, 'w') as configFile:
+                json.dump(model, configFile, indent=1, sort_keys=True)
+
+        run = {'run': runNumber, 'scenario': scenario, 'date': date or datetime.date.today().isoformat(),
+               'config_hash': digest, 'metadata': metadata or {}, 'start': nRows, 'rows': len(years)}
+        with open(os.path.join(self.directory, 'runs.jsonl'), 'a') as indexFile:
+            indexFile.write(json.dumps(run, sort_keys=True) + '\n')
+        self.runs.append(run)
+        self._columns = None
+        return runNumber
+
+    def select(self, scenario=None, since=None, until=None, where=None):
+        """
+        :param scenario: only runs of this scenario
+        :param since: only runs on or after this ISO date
+        :param until: only runs on or before this ISO date
+        :param where: dictionary of '/' separated configuration key: value the runs must have
+        :return: list of index entries
+        """
+
+        selected = []
+        for run in self.runs:
+            if scenario is not None and run['scenario'] != scenario:
+                continue
+            if (since is not None and run['date'] < since) or (until is not None and run['date'] > until):
+                continue
+            selected.append(run)
+        if where:
+            digests = self.matching_configs(where, set(run['config_hash'] for run in selected))
+            selected = [run for run in selected if run['config_hash'] in digests]
+        return selected
+
+    def _parameter_path(self, name):
+        return os.path.join(self.directory, 'parameters', name + '.txt')
+
+    def _index_parameters(self, digest, model):
+        """
+        Add a configuration to the key and value files, then to indexed.txt
+        """
+
+        for key, value in flatten(model).items():
+            with open(self._parameter_path(parameter_key(key, value)), 'a') as keyFile:
+                keyFile.write(digest + '\n')
+        with open(self._parameter_path('indexed'), 'a') as indexedFile:
+            indexedFile.write(digest + '\n')
+        if self._indexed is not None:
+            self._indexed.add(digest)
+
+    def _read_hashes(self, name):
+        if not os.path.exists(self._parameter_path(name)):
+            return set()
+        with open(self._parameter_path(name), 'r') as hashFile:
+            return set(line.strip() for line in hashFile if line.strip())
+
+    def matching_configs(self, where, digests):
+        """
+        :param where: dictionary of '/' separated configuration key: value
+        :param digests: configuration hashes to look at
+        :return: set of the configuration hashes among digests with all the keys and values of where
+        """
+
+        if self._indexed is None:
+            self._indexed = self._read_hashes('indexed')
+        for digest in sorted(digests - self._indexed):
+            self._index_parameters(digest, self.config_by_hash(digest))
+        for key, value in where.items():
+            digests = digests & self._read_hashes(parameter_key(key, value))
+        return digests
+
+    def query(self, metric, year=None, runs=None):
+        """
+        :param metric: one of projection.METRICS
+        :param year: only this year
+        :param runs: index entries to look at (from select), defaults to all
+        :return: numpy arrays of run number, year and value, one entry per matching row
+        """
+
+        columns = self.columns()
+        mask = np.ones(len(columns['run']), dtype=bool)
+        if year is not None:
+            mask &= columns['year'] == year
+        if runs is not None:
+            wanted = np.zeros(len(self.runs), dtype=bool)
+            wanted[[run['run'] for run in runs]] = True
+            mask &= wanted[columns['run']]
+        return columns['run'][mask], columns['year'][mask], columns[metric][mask]
+
+    def config(self, run):
+        """
+        :return: the merged configuration of a run
+        """
+
+        return self.config_by_hash(self.runs[run]['config_hash'])
+
+    def config_by_hash(self, digest):
+        with open(os.path.join(self.directory, 'configs', digest + '.json'), 'r') as configFile:
+            return json.load(configFile)
+
+
+def parse_where(items):
+    """
+    :param items: list of key=value strings, values parsed as JSON when possible
+    :return: dictionary
+    """
+
+    where = {}
+    for item in items or []:
+        key, value = item.split('=', 1)
+        try:
+            where[key] = json.loads(value)
+        except ValueError:
+            where[key] = value
+    return where
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archive of projection runs')
+    parser.add_argument('command', choices=['add', 'list', 'query'])
+    parser.add_argument('argument', nargs='?', help='configuration files for add, metric for query')
+    parser.add_argument('--archive', default='archive')
+    parser.add_argument('--scenario', default=None)
+    parser.add_argument('--date', default=None)
+    parser.add_argument('--since', default=None)
+    parser.add_argument('--until', default=None)
+    parser.add_argument('--year', type=int, default=None)
+    parser.add_argument('--where', nargs='*', default=None, help='key=value on the merged configuration')
+    args = parser.parse_args()
+
+    archive = Archive(args.archive)
+
+    if args.command == 'add':
+        modelNames = args.argument.split(',') if args.argument else None
+        model = configure(modelNames)
+        run = archive.append(model, evaluate(model), args.scenario or args.argument or 'default', date=args.date,
+                             metadata={'configurations': modelNames or []})
+        print('Archived run', run)
+        sys.exit(0)
+
+    runs = archive.select(args.scenario, args.since, args.until, parse_where(args.where))
+    if args.command == 'list':
+        print('run date scenario config_hash years')
+        for run in runs:
+            years = archive.columns()['year'][run['start']:run['start'] + run['rows']]
+            print(run['run'], run['date'], run['scenario'], run['config_hash'][:10],
+                  '%d-%d' % (years.min(), years.max()) if run['rows'] else '-')
+    else:
+        runNumbers, years, values = archive.query(args.argument, args.year, runs)
+        print('run date scenario year', args.argument)
+        for runNumber, year, value in zip(runNumbers, years, values):
+            run = archive.runs[runNumber]
+            print(runNumber, run['date'], run['scenario'], year, '{:.6g}'.format(value))
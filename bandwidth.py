@@ -0,0 +1,179 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./bandwidth.py config1.json,config2.json,...,configN.json
+
+Tape and disk throughput implied by the storage and CPU models.
+
+ Writes: the year to year increase of what is kept on tape and disk of each production year (storage.py), by tier:
+         the new data and any later increase in its copies. Copies removed from older data do not offset them. RAW
+         and other tiers can be given their own window (e.g. RAW is written while the LHC runs).
+ Recalls: the RAW needed for the re-reconstruction in cpu.py (activities.py), read back from tape and staged to disk,
+          over the windows of the re-reco campaigns in campaign_model.
+
+Sustained rates spread the yearly volume over the whole year, peak rates over the shortest window it has to happen in,
+times peak_factor. Both are compared with the drive and library limits in io_model.
+"""
+
+from __future__ import division, print_function
+
+import sys
+
+import numpy as np
+
+from activities import SECONDS_PER_YEAR, cpu_requirements, cpu_series
+from configure import configure, in_shutdown, model_years
+from performance import performance_by_year
+from plotting import plotBandwidth
+from labeled import LabeledArray
+from storage import data_on_media_by_cohort, data_produced
+from utils import time_dependent_value
+
+SECONDS_PER_DAY = 86400
+GIGA = 1e9
+
+
+def written(model, produced, medium):
+    """
+    :param model: The configuration dictionary
+    :param produced: LabeledArray from data_produced
+    :param medium: 'disk' or 'tape'
+    :return: LabeledArray by year and tier of the bytes written: the increase of what is kept of each production
+             year since the year before
+    """
+
+    kept = data_on_media_by_cohort(model, produced, medium)  # (year, producedYear, dataType, tier)
+    previous = np.concatenate([np.zeros((1,) + kept.shape[1:]), kept.values[:-1]])
+    writes = np.maximum(kept.values - previous, 0).sum(axis=(1, 2))
+    return LabeledArray([('year', kept.labels[kept.axis('year')]), ('tier', kept.labels[kept.axis('tier')])], writes)
+
+
+def new_on_media(model, produced, medium):
+    """
+    :return: numpy array by year of the bytes of that year's production kept on the medium in the year itself
+    """
+
+    kept = data_on_media_by_cohort(model, produced, medium)
+    firstYear = np.arange(kept.shape[0])
+    return kept.values[firstYear, firstYear].sum(axis=(1, 2))
+
+
+def write_rates(model, writes):
+    """
+    :param model: The configuration dictionary
+    :param writes: LabeledArray of bytes written by year and tier
+    :return: sustained and peak rates (bytes/s) by year
+    """
+
+    windows = model['io_model']['write_window_days']
+    tiers = writes.labels[writes.axis('tier')]
+    windowSeconds = np.array([windows.get(tier, windows['default']) for tier in tiers]) * SECONDS_PER_DAY
+
+    sustained = writes.values.sum(axis=1) / SECONDS_PER_YEAR
+    peak = (writes.values / windowSeconds).sum(axis=1) * model['io_model']['peak_factor']
+    return sustained, peak
+
+
+def recall_volume(model, years):
+    """
+    :param model: The configuration dictionary
+    :param years: Years being modeled
+    :return: numpy array by year of the RAW bytes recalled from tape for re-reconstruction
+    """
+
+    series = cpu_series(model, years)
+    cpuRequired, cpuTime = cpu_requirements(model, years)
+    rerecoEvents = cpuTime.select(activity='Non-Prompt Data').values / series['reco_time']
+    rawSize = np.array([performance_by_year(model, year, 'RAW', data_type='data')[1] for year in years])
+    return rerecoEvents * rawSize
+
+
+def recall_rates(model, recalls):
+    """
+    Spread the recalls over the re-reco campaigns
+
+    :param model: The configuration dictionary
+    :param recalls: numpy array by year of bytes recalled
+    :return: sustained and peak rates (bytes/s) by year
+    """
+
+    campaigns = [campaign for campaign in model['campaign_model']['campaigns'].values()
+                 if campaign['activity'] == 'Non-Prompt Data']
+    peakPerByte = max(campaign['fraction'] / (campaign['deadline_days'] * SECONDS_PER_DAY) for campaign in campaigns)
+    return recalls / SECONDS_PER_YEAR, recalls * peakPerByte * model['io_model']['peak_factor']
+
+
+def tape_limit(model, years):
+    """
+    :return: numpy array by year of the tape throughput (bytes/s) the drives and the library can sustain
+    """
+
+    ioModel = model['io_model']
+    drives = np.array([time_dependent_value(year, ioModel['tape_drives'])[0] for year in years])
+    driveRate = np.array([time_dependent_value(year, ioModel['tape_drive_rate'])[0] for year in years])
+    libraryRate = np.array([time_dependent_value(year, ioModel['tape_library_rate'])[0] for year in years])
+    return np.minimum(drives * driveRate * ioModel['drive_efficiency'], libraryRate)
+
+
+def disk_limit(model, years):
+    """
+    :return: numpy array by year of the aggregate disk throughput (bytes/s)
+    """
+
+    return np.array([time_dependent_value(year, model['io_model']['disk_rate'])[0] for year in years])
+
+
+if __name__ == '__main__':
+    modelNames = None
+    if len(sys.argv) > 1:
+        modelNames = sys.argv[1].split(',')
+    model = configure(modelNames)
+
+    YEARS = model_years(model)
+    dataProduced = data_produced(model, YEARS)
+
+    tapeWrites = written(model, dataProduced, 'tape')
+    diskWrites = written(model, dataProduced, 'disk')
+    recalls = recall_volume(model, YEARS)
+
+    # Whatever else changes, the data produced in a running year has to be written to disk in that year
+    diskNew = new_on_media(model, dataProduced, 'disk')
+    for index, year in enumerate(YEARS):
+        if not in_shutdown(model, year)[0] and diskWrites.values[index].sum() < diskNew[index] * (1 - 1e-9):
+            sys.exit('Disk writes in %d (%.1f PB) are below the data produced and kept on disk (%.1f PB)' %
+                     (year, diskWrites.values[index].sum() / 1e15, diskNew[index] / 1e15))
+
+    tapeWriteSustained, tapeWritePeak = write_rates(model, tapeWrites)
+    diskWriteSustained, diskWritePeak = write_rates(model, diskWrites)
+    recallSustained, recallPeak = recall_rates(model, recalls)
+
+    # Recalled data is staged to disk and read from there
+    diskSustained = diskWriteSustained + 2 * recallSustained
+    diskPeak = diskWritePeak + 2 * recallPeak
+    tapeSustained = tapeWriteSustained + recallSustained
+    tapePeak = tapeWritePeak + recallPeak
+    tapeLimit = tape_limit(model, YEARS)
+    diskLimit = disk_limit(model, YEARS)
+
+    print('Tape throughput in GB/s')
+    print('Year WriteSustained WritePeak RecallSustained RecallPeak TotalSustained TotalPeak Limit Ratio')
+    for index, year in enumerate(YEARS):
+        print(year, ' '.join('{:.2f}'.format(rate / GIGA) for rate in
+                             [tapeWriteSustained[index], tapeWritePeak[index], recallSustained[index],
+                              recallPeak[index], tapeSustained[index], tapePeak[index], tapeLimit[index]]),
+              '{:.2f}'.format(tapePeak[index] / tapeLimit[index]))
+
+    print('\nDisk throughput in GB/s')
+    print('Year WriteSustained WritePeak StageSustained StagePeak TotalSustained TotalPeak Limit Ratio')
+    for index, year in enumerate(YEARS):
+        print(year, ' '.join('{:.2f}'.format(rate / GIGA) for rate in
+                             [diskWriteSustained[index], diskWritePeak[index], 2 * recallSustained[index],
+                              2 * recallPeak[index], diskSustained[index], diskPeak[index], diskLimit[index]]),
+              '{:.2f}'.format(diskPeak[index] / diskLimit[index]))
+
+    plotBandwidth([[tapeWritePeak[index] / GIGA, recallPeak[index] / GIGA, tapeLimit[index] / GIGA]
+                   for index in range(len(YEARS))], name='Tape Bandwidth.png', title='Peak tape throughput',
+                  columns=['Write', 'Recall', 'Limit'], index=YEARS)
+    plotBandwidth([[diskWritePeak[index] / GIGA, 2 * recallPeak[index] / GIGA, diskLimit[index] / GIGA]
+                   for index in range(len(YEARS))], name='Disk Bandwidth.png', title='Peak disk throughput',
+                  columns=['Write', 'Stage', 'Limit'], index=YEARS)
@@ -0,0 +1,147 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./batch.py [config1.json,...,configN.json] [--input overrides.jsonl] [--output results.jsonl]
+
+Evaluate a stream of override documents, one JSON object per line (from --input, or stdin by default). Each document
+is a partial model like Run2030.json, applied on top of the configuration files given. An optional "name" key labels
+the scenario and is not passed to the model.
+
+Only --window documents are in flight at any time and results are appended to --output in input order as they come
+back, so memory does not grow with the number of scenarios. Progress (lines done and the size of the output file) is
+checkpointed to output + '.checkpoint'; running the same command again skips the finished lines and carries on.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import sys
+import traceback
+
+from configure import configure
+from projection import evaluate
+
+
+def evaluate_line(args):
+    """
+    Worker: evaluate one override document
+
+    :param args: (list of configuration files, line number, JSON text)
+    :return: one line of JSON with the yearly metrics or the error, nothing for a blank line
+    """
+
+    modelNames, lineNumber, text = args
+    if not text.strip():
+        return ''
+    record = {'line': lineNumber}
+    try:
+        overrides = json.loads(text)
+        record['name'] = overrides.pop('name', str(lineNumber))
+        results = evaluate(configure(modelNames + [overrides]))
+        record['years'] = results.labels[results.axis('year')]
+        record['metrics'] = dict((metric, results.select(metric=metric).values.tolist())
+                                 for metric in results.labels[results.axis('metric')])
+    except Exception as error:  # Keep going, the failure is in the output
+        record['error'] = '%s: %s' % (type(error).__name__, error)
+        record['traceback'] = traceback.format_exc()
+    return json.dumps(record, sort_keys=True) + '\n'
+
+
+def read_checkpoint(path):
+    """
+    :return: (number of input lines done, bytes of output written for them), (0, 0) if there is no checkpoint
+    """
+
+    if not os.path.exists(path):
+        return 0, 0
+    with open(path, 'r') as checkpointFile:
+        checkpoint = json.load(checkpointFile)
+    return checkpoint['lines'], checkpoint['bytes']
+
+
+def write_checkpoint(path, lines, nBytes):
+    """
+    Replace the checkpoint atomically so that an interruption leaves either the old or the new one
+    """
+
+    with open(path + '.tmp', 'w') as checkpointFile:
+        json.dump({'lines': lines, 'bytes': nBytes}, checkpointFile)
+    os.rename(path + '.tmp', path)
+
+
+def run_batch(modelNames, inputFile, outputPath, processes=None, window=None, checkpointEvery=100):
+    """
+    :param modelNames: list of configuration files the overrides are applied to
+    :param inputFile: open file of JSON lines
+    :param outputPath: JSON lines file the results are appended to
+    :param processes: number of worker processes, defaults to the number of CPUs
+    :param window: maximum number of documents being evaluated or waiting to be written
+    :param checkpointEvery: write the checkpoint after this many results
+    :return: number of lines evaluated in this run
+    """
+
+    checkpointPath = outputPath + '.checkpoint'
+    linesDone, bytesDone = read_checkpoint(checkpointPath)
+
+    # Drop anything written after the last checkpoint, it will be redone
+    with open(outputPath, 'a') as outputFile:
+        outputFile.truncate(bytesDone)
+
+    pool = multiprocessing.Pool(processes)
+    window = window or 4 * (processes or multiprocessing.cpu_count())
+    pending = collections.deque()
+    evaluated = 0
+
+    try:
+        with open(outputPath, 'a') as outputFile:
+            sinceCheckpoint = 0
+            for lineNumber, text in enumerate(inputFile):
+                if lineNumber < linesDone:
+                    continue
+                pending.append(pool.apply_async(evaluate_line, ((modelNames, lineNumber, text),)))
+                # Write whatever is finished at the head of the queue, waiting only when the window is full
+                while len(pending) >= window or (pending and pending[0].ready()):
+                    outputFile.write(pending.popleft().get())
+                    sinceCheckpoint += 1
+                if sinceCheckpoint >= checkpointEvery:
+                    evaluated += sinceCheckpoint
+                    linesDone += sinceCheckpoint
+                    sinceCheckpoint = 0
+                    outputFile.flush()
+                    write_checkpoint(checkpointPath, linesDone, outputFile.tell())
+
+            while pending:
+                outputFile.write(pending.popleft().get())
+                sinceCheckpoint += 1
+            evaluated += sinceCheckpoint
+            linesDone += sinceCheckpoint
+            outputFile.flush()
+            write_checkpoint(checkpointPath, linesDone, outputFile.tell())
+    finally:
+        pool.terminate()
+        pool.join()
+    return evaluated
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluate a stream of override documents')
+    parser.add_argument('models', nargs='?', default=None, help='comma separated list of configuration files')
+    parser.add_argument('--input', default='-', help='JSON lines file of override documents, - for stdin')
+    parser.add_argument('--output', default='results.jsonl')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--window', type=int, default=None)
+    parser.add_argument('--checkpoint-every', type=int, default=100)
+    args = parser.parse_args()
+
+    modelNames = args.models.split(',') if args.models else []
+    if args.input == '-':
+        nEvaluated = run_batch(modelNames, sys.stdin, args.output, args.processes, args.window, args.checkpoint_every)
+    else:
+        with open(args.input, 'r') as inputFile:
+            nEvaluated = run_batch(modelNames, inputFile, args.output, args.processes, args.window,
+                                   args.checkpoint_every)
+    print('Evaluated %d scenarios into %s' % (nEvaluated, args.output), file=sys.stderr)
@@ -0,0 +1,351 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./calibrate.py accounting1.csv ... [--models config1.json,...,configN.json] [--parameters PREFIX ...]
+                      [--output Calibrated.json]
+
+Fit the per event CPU times and sizes (and the other parameters selected) to monthly accounting exports, report the
+residuals and write the fitted values as an override file to use on top of the same configuration files.
+
+The accounting files are CSV with the columns month (YYYY-MM), quantity, tier and value. Several rows for the same
+month, quantity and tier (sites, say) are added up.
+ cpu: HS06 * s used in the month, all activities (tier left empty)
+ produced: PB of new data written in the month for a tier
+ disk, tape: PB stored at the end of the month for a tier
+Monthly CPU and production are summed to yearly totals, only for years with all twelve months. For disk and tape the
+December value of each year is compared with the model, years without one are left out.
+
+The fit is Levenberg-Marquardt on the residuals relative to the largest value of each series, with each parameter
+scaled by a factor exp(x) so it keeps its sign, or for those with a range (BOUNDS, live fractions in (0, 1)) mapped
+into it with a logistic function. The Jacobian comes from derivatives.jacobian (all parameters in one batched complex
+step evaluation), and the steps for several damping values are tried as one batch of candidate models.
+
+Parameters the accounting does not constrain are reported and left alone: those it does not depend on (a zero column
+of the Jacobian) and those whose effect is a combination of parameters before them in --parameters (the data cannot
+tell them apart, the first ones are fitted).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import copy
+import csv
+import json
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+from activities import cpu_requirements
+from configure import configure, get_parameter, parameter_name, set_parameter
+from derivatives import jacobian, numeric_parameters
+from labeled import LabeledArray
+from projection import compile_inputs
+from storage import data_on_media, static_data
+
+PETA = 1e15
+
+FLOWS = ['cpu', 'produced']
+STOCKS = ['disk', 'tape']
+FIT_PARAMETERS = ['cpu_time', 'tier_sizes', 'improvement_factors/software_by_kind', 'live_fraction']
+DAMPING = [0, 1e-4, 1e-3, 1e-2, 1e-1, 1, 10]
+BOUNDS = {'live_fraction': (0, 1)}  # Parameter prefix: range it is fitted in
+RANK_TOLERANCE = 1e-6
+
+
+def accounting_model(model, years):
+    """
+    What the accounting measures, according to the model
+
+    :param model: The configuration dictionary
+    :param years: Years to consider
+    :return: LabeledArray by year and observable: 'cpu' (HS06 * s), 'produced/TIER', 'disk/TIER' and 'tape/TIER'
+             (PB), after any batch dimensions of the parameters
+    """
+
+    inputs = compile_inputs(model, years)
+    cpuRequired, cpuTime = cpu_requirements(model, years, inputs['series'])
+    produced = inputs['produced']
+    tiers = produced.labels[produced.axis('tier')]
+
+    names = ['cpu']
+    columns = [cpuTime.sum('activity').values[..., np.newaxis]]
+    names.extend('produced/' + tier for tier in tiers)
+    columns.append(produced.sum('dataType').values / PETA)
+    for medium in STOCKS:
+        static = static_data(model, medium, years).sum('producedYear')
+        staticTiers = static.labels[static.axis('tier')]
+        names.extend(medium + '/' + tier for tier in tiers + staticTiers)
+        columns.append(data_on_media(model, produced, medium).sum('dataType').values / PETA)
+        columns.append(static.values / PETA)
+
+    batchShape = np.broadcast(*[np.empty(column.shape[:-2]) for column in columns]).shape
+    values = np.concatenate([np.broadcast_to(column, batchShape + column.shape[-2:]) for column in columns], axis=-1)
+    return LabeledArray([('year', years), ('observable', names)], values)
+
+
+def load_accounting(fileNames):
+    """
+    :param fileNames: list of accounting CSV files
+    :return: dictionary of (year, observable): yearly value (HS06 * s or PB), and list of (year, observable) left out
+             for lack of some months (of December for disk and tape)
+    """
+
+    monthly = defaultdict(lambda: defaultdict(float))
+    for fileName in fileNames:
+        with open(fileName, 'r') as accountingFile:
+            for row in csv.DictReader(accountingFile):
+                year, month = [int(part) for part in row['month'].split('-')[:2]]
+                quantity = row['quantity'].strip()
+                if quantity not in FLOWS + STOCKS:
+                    raise ValueError('Unknown quantity %r in %s' % (quantity, fileName))
+                observable = quantity if quantity == 'cpu' else quantity + '/' + row['tier'].strip()
+                monthly[(year, observable)][month] += float(row['value'])
+
+    observed = {}
+    incomplete = []
+    for (year, observable), values in sorted(monthly.items()):
+        if observable.split('/')[0] in STOCKS:
+            if 12 in values:
+                observed[(year, observable)] = values[12]
+            else:
+                incomplete.append((year, observable))
+        elif len(values) == 12:
+            observed[(year, observable)] = sum(values.values())
+        else:
+            incomplete.append((year, observable))
+    return observed, incomplete
+
+
+def observed_entries(results, observed):
+    """
+    :param results: LabeledArray by year and observable (accounting_model, or its derivatives), possibly with batch
+                    dimensions
+    :param observed: dictionary of (year, observable): value
+    :return: array of the results for each entry of observed, in sorted order (the last axis)
+    """
+
+    keys = sorted(observed)
+    indices = tuple(np.array([results.position(name, key[axis]) for key in keys])
+                    for axis, name in enumerate(['year', 'observable']))
+    return results.values[(Ellipsis,) + indices]
+
+
+def series_scales(observed):
+    """
+    :return: array with, for each entry of observed in sorted order, the largest value observed for its observable.
+             Residuals are relative to it so that years with little or nothing (shutdowns) do not dominate.
+    """
+
+    largest = defaultdict(float)
+    for (year, observable), value in observed.items():
+        largest[observable] = max(largest[observable], abs(value))
+    return np.array([largest[observable] for year, observable in sorted(observed)])
+
+
+def residuals(results, observed):
+    """
+    :return: array of residuals (model - observed) / series_scales, one per entry of observed (the last axis)
+    """
+
+    values = np.array([observed[key] for key in sorted(observed)])
+    return (observed_entries(results, observed) - values) / series_scales(observed)
+
+
+def bounds(path):
+    """
+    :return: (lower, upper) range of the parameter if it has one (BOUNDS), otherwise None
+    """
+
+    name = parameter_name(path) + '/'
+    for prefix, limits in BOUNDS.items():
+        if name.startswith(prefix + '/'):
+            return limits
+    return None
+
+
+def transform(model, paths):
+    """
+    The fit variables x of the parameters: parameter * exp(x), or lower + (upper - lower) / (1 + exp(-x)) for those
+    with bounds
+
+    :return: initial x (array by parameter), function of x (parameter, ...) giving the parameter values and function
+             of x giving d parameter / d x
+    """
+
+    initial = np.array([get_parameter(model, path) for path in paths], dtype=np.float64)
+    limits = [bounds(path) for path in paths]
+    bounded = np.array([limit is not None for limit in limits])
+    lower = np.array([limit[0] if limit else 0 for limit in limits], dtype=np.float64)
+    upper = np.array([limit[1] if limit else 1 for limit in limits], dtype=np.float64)
+    for path, value, limit in zip(paths, initial, limits):
+        if limit and not limit[0] < value < limit[1]:
+            raise ValueError('%s is %s, outside of the range (%s, %s) it is fitted in' %
+                             ((parameter_name(path), value) + tuple(limit)))
+    fraction = np.where(bounded, (initial - lower) / (upper - lower), 0.5)
+    x0 = np.where(bounded, np.log(fraction / (1 - fraction)), 0)
+
+    def expand(array, x):
+        return array.reshape(array.shape + (1,) * (np.ndim(x) - 1))
+
+    def values(x):
+        return np.where(expand(bounded, x), expand(lower, x) + expand(upper - lower, x) / (1 + np.exp(-x)),
+                        expand(initial, x) * np.exp(x))
+
+    def derivatives(x):
+        parameters = values(x)
+        return np.where(bounded, (parameters - lower) * (upper - parameters) / (upper - lower), parameters)
+
+    return x0, values, derivatives
+
+
+def fitted_model(model, paths, values):
+    """
+    :param values: array of parameter values (parameter, ...), trailing axes become batch axes
+    :return: a copy of model with the parameters set
+    """
+
+    fitted = copy.deepcopy(model)
+    for index, path in enumerate(paths):
+        set_parameter(fitted, path, values[index])
+    return fitted
+
+
+def independent(columns):
+    """
+    :param columns: array (entry, parameter) of the Jacobian
+    :return: list of booleans by parameter, False for those whose column is a combination of the earlier ones kept
+    """
+
+    norms = np.sqrt(np.sum(columns ** 2, axis=0))
+    normalized = columns / np.where(norms > 0, norms, 1)
+    keep = []
+    for index in range(columns.shape[1]):
+        candidate = normalized[:, [kept for kept, flag in enumerate(keep) if flag] + [index]]
+        singular = np.linalg.svd(candidate, compute_uv=False)
+        keep.append(bool(norms[index] > 0 and singular[-1] > RANK_TOLERANCE * singular[0]))
+    return keep
+
+
+def calibrate(model, observed, paths, iterations=50, tolerance=1e-10):
+    """
+    :param model: The configuration dictionary
+    :param observed: dictionary of (year, observable): value from load_accounting
+    :param paths: parameters to fit. Among parameters the data cannot tell apart, the first ones are fitted.
+    :param iterations: maximum number of Levenberg-Marquardt steps
+    :param tolerance: stop when the cost improves by less than this fraction
+    :return: the fitted model, the list of paths fitted, the list of paths the accounting does not constrain (left as
+             they are) and the cost (half the sum of squared residuals) after each step
+    """
+
+    years = list(range(model['start_year'], max(year for year, observable in observed) + 1))
+    scales = series_scales(observed)
+
+    paths = [path for path in paths if get_parameter(model, path) != 0]
+    if not paths:
+        raise ValueError('None of the parameters selected is a non-zero number')
+    x, values, slopes = transform(model, paths)
+    results, derivatives = jacobian(model, paths, years, function=accounting_model)
+    keep = independent((observed_entries(derivatives, observed) * slopes(x)[:, np.newaxis] / scales).T)
+    unconstrained = [path for path, flag in zip(paths, keep) if not flag]
+    paths = [path for path, flag in zip(paths, keep) if flag]
+    if not paths:
+        raise ValueError('None of the parameters selected changes what the accounting measures')
+    x, values, slopes = transform(model, paths)
+
+    costs = [0.5 * np.sum(residuals(results, observed) ** 2)]
+    for iteration in range(iterations):
+        results, derivatives = jacobian(fitted_model(model, paths, values(x)), paths, years,
+                                        function=accounting_model)
+        r = residuals(results, observed)
+        # d r / d x = d model / d parameter * d parameter / d x / scale
+        J = (observed_entries(derivatives, observed) * slopes(x)[:, np.newaxis] / scales).T
+
+        # One step per damping value, solved as least squares
+        norms = np.sqrt(np.sum(J ** 2, axis=0))
+        steps = []
+        for damping in DAMPING:
+            system = np.vstack([J, np.diag(np.sqrt(damping) * norms)])
+            steps.append(np.linalg.lstsq(system, np.concatenate([-r, np.zeros(len(paths))]), rcond=-1)[0])
+        steps = np.array(steps).T  # (parameter, candidate)
+
+        candidates = accounting_model(fitted_model(model, paths, values(x[:, np.newaxis] + steps)), years)
+        candidateCosts = 0.5 * np.sum(residuals(candidates, observed) ** 2, axis=-1)
+        best = int(np.nanargmin(candidateCosts))
+        if not candidateCosts[best] < costs[-1]:
+            break
+        x = x + steps[:, best]
+        costs.append(candidateCosts[best])
+        if costs[-2] - costs[-1] <= tolerance * costs[-2]:
+            break
+
+    return fitted_model(model, paths, values(x)), paths, unconstrained, costs
+
+
+def overrides(model, fitted, paths):
+    """
+    :return: override dictionary with the top level sections holding fitted parameters, as in fitted
+    """
+
+    sections = sorted(set(path[0] for path in paths))
+    return dict((section, json.loads(json.dumps(fitted[section], default=float))) for section in sections)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fit model parameters to accounting data')
+    parser.add_argument('accounting', nargs='+', help='CSV files of monthly accounting')
+    parser.add_argument('--models', default=None, help='comma separated list of configuration files')
+    parser.add_argument('--parameters', nargs='*', default=FIT_PARAMETERS,
+                        help='parameters to fit, names or prefixes such as cpu_time/data')
+    parser.add_argument('--output', default='Calibrated.json')
+    args = parser.parse_args()
+
+    model = configure(args.models.split(',') if args.models else None)
+    observed, incomplete = load_accounting(args.accounting)
+    for year, observable in incomplete:
+        print('Left out %s in %d, %s' % (observable, year, 'no December value' if observable.split('/')[0] in STOCKS
+                                         else 'not all months are there'))
+    # Series that are all zero (tape copies of a tier never kept, say) have nothing to fit to
+    empty = set(observable for key, observable in observed) - set(key[1] for key, value in observed.items() if value)
+    observed = dict((key, value) for key, value in observed.items()
+                    if key[0] >= model['start_year'] and key[1] not in empty)
+    if not observed:
+        sys.exit('No accounting data in the years modeled')
+    known = accounting_model(model, [model['start_year']]).labels[1]
+    for observable in sorted(set(observable for year, observable in observed) - set(known)):
+        print('Left out %s, not in the model' % observable)
+    observed = dict((key, value) for key, value in observed.items() if key[1] in known)
+    if not observed:
+        sys.exit('None of the accounting data is in the model')
+
+    paths = [path for path in numeric_parameters(model, sorted(set(prefix.split('/')[0]
+                                                                   for prefix in args.parameters)))
+             if any((parameter_name(path) + '/').startswith(prefix.rstrip('/') + '/') for prefix in args.parameters)]
+    try:
+        fitted, fittedPaths, unconstrained, costs = calibrate(model, observed, paths)
+    except ValueError as error:
+        sys.exit('Cannot calibrate %s: %s' % (', '.join(args.parameters), error))
+    print('Fitted %d of %d parameters in %d steps, cost %.4g -> %.4g' %
+          (len(fittedPaths), len(paths), len(costs) - 1, costs[0], costs[-1]))
+    if unconstrained:
+        print('\nNot constrained by the accounting, left as they are:')
+        for path in unconstrained:
+            print(' ', parameter_name(path))
+
+    years = list(range(model['start_year'], max(year for year, observable in observed) + 1))
+    before = observed_entries(accounting_model(model, years), observed)
+    after = accounting_model(fitted, years)
+    print('\nyear observable observed model fitted residual (of the largest value observed)')
+    for (year, observable), initial, final, residual in zip(sorted(observed), before,
+                                                             observed_entries(after, observed),
+                                                             residuals(after, observed)):
+        print(year, observable, '{:.4g} {:.4g} {:.4g} {:+.2%}'.format(observed[(year, observable)], initial, final,
+                                                                      residual))
+
+    print('\nparameter value fitted')
+    for path in fittedPaths:
+        print(parameter_name(path), '{:.6g} {:.6g}'.format(get_parameter(model, path), get_parameter(fitted, path)))
+
+    with open(args.output, 'w') as outputFile:
+        json.dump(overrides(model, fitted, fittedPaths), outputFile, indent=1, sort_keys=True)
+    print('\nWrote', args.output)
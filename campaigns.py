@@ -0,0 +1,201 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./campaigns.py config1.json,config2.json,...,configN.json
+
+Discrete event simulation of the CPU workload against the modeled capacity. cpu.py assumes, for instance, that 25% of
+the data is re-reconstructed within a month and that MC is spread evenly over the year. Here each activity's yearly
+CPU time (from activities.py) is cut into campaigns as described by campaign_model: a share of the activity,
+submitted in a number of batches over a window of the year, each batch with a deadline. Batches are split into jobs
+which run on the job slots given by the capacity model (capacity_model / core_hs06), highest priority first.
+
+Jobs from the same batch that start together also finish together, so they are handled as one event. That keeps the
+event queue small even with millions of jobs per year.
+
+Reports when each campaign finishes compared to its deadline, the backlog and the utilization of the slots by year.
+"""
+
+from __future__ import division, print_function
+
+import heapq
+import sys
+
+import numpy as np
+
+from activities import SECONDS_PER_YEAR, cpu_requirements
+from capacity import capacity_model
+from configure import configure, model_years
+
+SECONDS_PER_DAY = 86400
+
+# Event types, in the order they are handled when they happen at the same time
+FINISH, CAPACITY, SUBMIT = range(3)
+
+
+class Batch(object):
+    """
+    A number of identical jobs submitted together
+    """
+
+    def __init__(self, campaign, year, submitTime, deadline, priority, nJobs, jobDuration):
+        self.campaign = campaign
+        self.year = year
+        self.submitTime = submitTime
+        self.deadline = deadline
+        self.priority = priority
+        self.pending = nJobs
+        self.running = 0
+        self.nJobs = nJobs
+        self.jobDuration = jobDuration
+        self.finishTime = None
+
+
+def make_batches(model, years, cpuTime):
+    """
+    Cut the yearly CPU time of each activity into batches of jobs
+
+    :param model: The configuration dictionary
+    :param years: Years being simulated
+    :param cpuTime: LabeledArray of HS06 * s by year and activity
+    :return: list of Batch
+    """
+
+    campaignModel = model['campaign_model']
+    coreHS06 = campaignModel['core_hs06']
+    jobWork = coreHS06 * campaignModel['job_hours'] * 3600
+
+    batches = []
+    for name, campaign in sorted(campaignModel['campaigns'].items()):
+        for index, year in enumerate(years):
+            work = campaign['fraction'] * cpuTime.get(year=year, activity=campaign['activity'])
+            if work <= 0:
+                continue
+            nBatches = campaign.get('batches', 1)
+            start = index * SECONDS_PER_YEAR + campaign.get('start_day', 0) * SECONDS_PER_DAY
+            end = index * SECONDS_PER_YEAR + campaign.get('end_day', campaign.get('start_day', 0)) * SECONDS_PER_DAY
+            step = (end - start) / nBatches
+            nJobs = max(1, int(np.ceil(work / nBatches / jobWork)))
+            jobDuration = work / nBatches / nJobs / coreHS06
+            for submit in start + step * np.arange(nBatches):
+                batches.append(Batch(name, year, submit, submit + campaign['deadline_days'] * SECONDS_PER_DAY,
+                                     campaign.get('priority', 0), nJobs, jobDuration))
+    return batches
+
+
+def simulate(model, years=None):
+    """
+    Run the event loop
+
+    :param model: The configuration dictionary
+    :param years: Years to simulate, defaults to start_year through end_year
+    :return: list of Batch (with finishTime filled), and a dictionary of per-year arrays: slots, busy slot-seconds,
+             backlog (HS06 * s queued) at the end of the year and at its largest, jobs started and number of events
+    """
+
+    years = years or model_years(model)
+    coreHS06 = model['campaign_model']['core_hs06']
+    cpuRequired, cpuTime = cpu_requirements(model, years)
+    slots = (capacity_model(model, 'cpu', years) / coreHS06).astype(np.int64)
+    batches = make_batches(model, years, cpuTime)
+
+    stats = {key: np.zeros(len(years)) for key in ['busy', 'backlog', 'max_backlog', 'jobs', 'events']}
+    stats['slots'] = slots.astype(np.float64)
+
+    events = []  # (time, type, sequence, payload)
+    sequence = 0
+    for index in range(len(years)):
+        events.append((index * SECONDS_PER_YEAR, CAPACITY, sequence, index))
+        sequence += 1
+    for batch in batches:
+        events.append((batch.submitTime, SUBMIT, sequence, batch))
+        sequence += 1
+    heapq.heapify(events)
+
+    queue = []  # (priority, submit time, sequence, batch) of batches with pending jobs
+    totalSlots = 0
+    running = 0
+    backlog = 0.0
+    lastTime = 0.0
+    endTime = len(years) * SECONDS_PER_YEAR
+
+    while events:
+        time, eventType, _sequence, payload = heapq.heappop(events)
+        if time > endTime:
+            stats['busy'][-1] += running * (endTime - lastTime)
+            break
+        yearIndex = min(int(time // SECONDS_PER_YEAR), len(years) - 1)
+        stats['busy'][min(int(lastTime // SECONDS_PER_YEAR), len(years) - 1)] += running * (time - lastTime)
+        stats['events'][yearIndex] += 1
+        lastTime = time
+
+        if eventType == CAPACITY:
+            if payload > 0:
+                stats['backlog'][payload - 1] = backlog
+            totalSlots = slots[payload]
+        elif eventType == SUBMIT:
+            heapq.heappush(queue, (payload.priority, payload.submitTime, sequence, payload))
+            sequence += 1
+            backlog += payload.pending * payload.jobDuration * coreHS06
+        elif eventType == FINISH:
+            batch, nJobs = payload
+            batch.running -= nJobs
+            running -= nJobs
+            if not batch.running and not batch.pending:
+                batch.finishTime = time
+
+        # Fill the free slots, highest priority first
+        while queue and running < totalSlots:
+            batch = queue[0][-1]
+            nJobs = min(batch.pending, totalSlots - running)
+            batch.pending -= nJobs
+            batch.running += nJobs
+            running += nJobs
+            backlog -= nJobs * batch.jobDuration * coreHS06
+            stats['jobs'][yearIndex] += nJobs
+            heapq.heappush(events, (time + batch.jobDuration, FINISH, sequence, (batch, nJobs)))
+            sequence += 1
+            if not batch.pending:
+                heapq.heappop(queue)
+
+        stats['max_backlog'][yearIndex] = max(stats['max_backlog'][yearIndex], backlog)
+
+    stats['backlog'][-1] = backlog
+    stats['utilization'] = stats['busy'] / (stats['slots'] * SECONDS_PER_YEAR)
+    return batches, stats
+
+
+if __name__ == '__main__':
+    modelNames = None
+    if len(sys.argv) > 1:
+        modelNames = sys.argv[1].split(',')
+    model = configure(modelNames)
+
+    YEARS = model_years(model)
+    CAMPAIGNS = sorted(model['campaign_model']['campaigns'].keys())
+    tera = 1e12
+    batches, stats = simulate(model, YEARS)
+
+    print('Campaign completion: worst days from submission to completion (deadline) and number of late batches')
+    print('Year ' + ' '.join(CAMPAIGNS))
+    for year in YEARS:
+        line = str(year)
+        for campaign in CAMPAIGNS:
+            yearBatches = [batch for batch in batches if batch.campaign == campaign and batch.year == year]
+            if not yearBatches:
+                line += ' -'
+                continue
+            unfinished = [batch for batch in yearBatches if batch.finishTime is None]
+            worst = max((batch.finishTime or np.inf) - batch.submitTime for batch in yearBatches) / SECONDS_PER_DAY
+            late = sum(1 for batch in yearBatches if batch.finishTime is None or batch.finishTime > batch.deadline)
+            deadline = model['campaign_model']['campaigns'][campaign]['deadline_days']
+            line += ' {:.1f}({:.0f})/{:d}{}'.format(worst, deadline, late, '*' if unfinished else '')
+        print(line)
+    print('* some batches never finish')
+
+    print('\nSlots, utilization, jobs started and backlog in THS06 * s')
+    print('Year Slots Utilization Jobs Events Backlog MaxBacklog')
+    for index, year in enumerate(YEARS):
+        print(year, int(stats['slots'][index]), '{:.3f}'.format(stats['utilization'][index]),
+              int(stats['jobs'][index]), int(stats['events'][index]),
+              '{:.2f}'.format(max(stats['backlog'][index], 0) / tera),
+              '{:.2f}'.format(max(stats['max_backlog'][index], 0) / tera))
@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+
+
+"""
+Capacity model common to CPU, disk and tape
+
+Start from the capacity in [resource]_year, assumed to have been bought in equal chunks over its lifetime. Every
+following year buy [resource]_delta (which can be time dependent), improved by the technology factor for every
+year since the delta was set, and retire what was bought [resource]_lifetime years before.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from configure import model_years
+from labeled import stack_trailing
+from utils import time_dependent_value
+
+# Which improvement factor makes each resource cheaper
+IMPROVEMENT_FACTORS = {'cpu': 'hardware', 'disk': 'disk', 'tape': 'tape'}
+
+
+def capacity_model(model, resource, years=None):
+    """
+    :param model: The configuration dictionary
+    :param resource: 'cpu', 'disk' or 'tape'
+    :param years: Years to return, defaults to start_year through end_year
+    :return: numpy array of capacity (HS06 or bytes) for each year (the last axis)
+    """
+
+    years = years or model_years(model)
+    capacityModel = model['capacity_model']
+    firstYear = capacityModel[resource + '_year']
+    start = capacityModel[resource + '_start']
+    lifetime = capacityModel[resource + '_lifetime']
+    factor = model['improvement_factors'][IMPROVEMENT_FACTORS[resource]]
+
+    # A bit of a kludge. Assume what we have now was bought and will be retired in equal chunks over its lifetime
+    added = {year: start / lifetime for year in range(firstYear - lifetime + 1, firstYear + 1)}
+    capacity = {firstYear: start}
+
+    lastDeltaYear = firstYear
+    for year in range(firstYear + 1, max(years) + 1):
+        delta, deltaYear = time_dependent_value(year, capacityModel[resource + '_delta'])
+        if deltaYear is not None:
+            lastDeltaYear = deltaYear
+        added[year] = (0 if delta is None else delta) * factor ** (year - lastDeltaYear)
+
+        # Retire what was added N years ago or retire 0
+        capacity[year] = capacity[year - 1] + added[year] - added.get(year - lifetime, 0)
+
+    return stack_trailing([capacity[year] for year in years])
@@ -0,0 +1,320 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./compare.py RealisticModel.json other.json,more.json ... [--depth N] [--method sequential|shapley]
+                    [--year YEAR]
+
+Compare configurations (each a comma separated list of configuration files; the first is the baseline): the CPU
+required by activity and the disk and tape required by tier, per year, and their differences to the baseline.
+
+The difference in total CPU, disk and tape is then attributed to the configuration keys that differ (down to --depth
+levels, e.g. storage_model/disk_replicas for 2) by substituting the keys of the other configuration into the baseline.
+Keys below the top level can give configurations that do not hold together (a tier in one table but not another).
+ sequential: one key after the other, in sorted order, each credited with the change it makes
+ shapley: each key credited with its average change over all subsets of the other keys (2^k substitutions)
+
+Substitutions are not run one by one. Configurations that only differ in numeric parameters (see derivatives.py) are
+evaluated together with those parameters as arrays along a batch dimension; the others are grouped by the rest of
+their values.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import copy
+import csv
+import itertools
+import json
+import math
+from collections import defaultdict
+
+import numpy as np
+
+from activities import cpu_requirements
+from configure import configure, get_parameter, model_years, parameter_name, set_parameter
+from derivatives import numeric_parameters
+from labeled import LabeledArray
+from projection import compile_inputs
+from storage import data_on_media, static_data
+
+PETA = 1e15
+KILO = 1e3
+
+RESOURCES = [('cpu', KILO, 'kHS06'), ('disk', PETA, 'PB'), ('tape', PETA, 'PB')]
+MAX_SHAPLEY_KEYS = 12
+MISSING = object()
+
+
+def breakdown(model, years):
+    """
+    :param model: The configuration dictionary
+    :param years: Years to consider
+    :return: LabeledArray by year and component: 'cpu/ACTIVITY' (HS06), 'disk/TIER' and 'tape/TIER' (bytes, static
+             data included), after any batch dimensions of the parameters
+    """
+
+    inputs = compile_inputs(model, years)
+    cpuRequired, cpuTime = cpu_requirements(model, years, inputs['series'])
+    produced = inputs['produced']
+
+    names = ['cpu/' + activity for activity in cpuRequired.labels[cpuRequired.axis('activity')]]
+    columns = [cpuRequired.values]
+    for medium in ['disk', 'tape']:
+        kept = data_on_media(model, produced, medium).sum('dataType')
+        static = static_data(model, medium, years).sum('producedYear')
+        tiers = kept.labels[kept.axis('tier')] + static.labels[static.axis('tier')]
+        names.extend(medium + '/' + tier for tier in tiers)
+        columns.extend([kept.values, static.values])
+
+    batchShape = np.broadcast(*[np.empty(column.shape[:-2]) for column in columns]).shape
+    values = np.concatenate([np.broadcast_to(column, batchShape + column.shape[-2:]) for column in columns], axis=-1)
+    return LabeledArray([('year', years), ('component', names)], values)
+
+
+def structure(model, paths):
+    """
+    :return: the model with the numeric parameters in paths left out, as canonical JSON
+    """
+
+    skeleton = copy.deepcopy(model)
+    for path in paths:
+        set_parameter(skeleton, path, None)
+    return json.dumps(skeleton, sort_keys=True)
+
+
+def batched_breakdowns(models, years):
+    """
+    Breakdowns of many configurations, evaluating those that differ only in numeric parameters in one pass
+
+    :param models: list of configuration dictionaries
+    :param years: Years to consider
+    :return: list of LabeledArrays by year and component, one per model
+    """
+
+    groups = defaultdict(list)
+    paths = {}
+    for index, model in enumerate(models):
+        modelPaths = numeric_parameters(model)
+        key = structure(model, modelPaths)
+        groups[key].append(index)
+        paths[key] = modelPaths
+
+    results = [None] * len(models)
+    for key, indices in groups.items():
+        batched = copy.deepcopy(models[indices[0]])
+        for path in paths[key]:
+            values = [get_parameter(models[index], path) for index in indices]
+            if any(value != values[0] for value in values):
+                set_parameter(batched, path, np.array(values, dtype=np.float64))
+        try:
+            group = breakdown(batched, years)
+        except KeyError as error:
+            raise ValueError('A configuration cannot be evaluated, missing %s. Substituting keys deeper than the top '
+                             'level can leave the tables inconsistent.' % error)
+        values = np.broadcast_to(group.values, (len(indices),) + group.values.shape[-2:])
+        for position, index in enumerate(indices):
+            results[index] = LabeledArray(group.axes, values[position])
+    return results
+
+
+def aligned(breakdowns):
+    """
+    :param breakdowns: list of LabeledArrays by year and component
+    :return: numpy array (model, year, component) over the components of all of them (zero where missing) and the
+             list of components
+    """
+
+    components = []
+    for labeled in breakdowns:
+        components.extend(name for name in labeled.labels[1] if name not in components)
+    values = np.zeros((len(breakdowns), len(breakdowns[0].labels[0]), len(components)))
+    for index, labeled in enumerate(breakdowns):
+        values[index][:, [components.index(name) for name in labeled.labels[1]]] = labeled.values
+    return values, components
+
+
+def totals(values, components):
+    """
+    :return: numpy array (..., year, resource) of the components summed by resource (cpu, disk, tape)
+    """
+
+    return np.stack([values[..., [index for index, name in enumerate(components) if name.startswith(resource + '/')]]
+                     .sum(axis=-1) for resource, scale, unit in RESOURCES], axis=-1)
+
+
+def differing_keys(base, other, depth, path=()):
+    """
+    :return: list of paths (tuples of keys), at most depth long, under which base and other differ
+    """
+
+    if base == other:
+        return []
+    if len(path) < depth and isinstance(base, dict) and isinstance(other, dict):
+        keys = []
+        for key in sorted(set(base) | set(other)):
+            keys.extend(differing_keys(base.get(key, MISSING), other.get(key, MISSING), depth, path + (key,)))
+        return keys
+    return [path]
+
+
+def added_or_removed(base, other):
+    """
+    :return: set of the dictionary keys found on one side only, anywhere under base and other
+    """
+
+    if not isinstance(base, dict) or not isinstance(other, dict):
+        return set()
+    names = set(base) ^ set(other)
+    for key in set(base) & set(other):
+        names |= added_or_removed(base[key], other[key])
+    return names
+
+
+def linked_keys(base, other, depth=1):
+    """
+    The keys that differ, those adding or removing the same entries (a tier, say) put together as they cannot be
+    substituted one without the other
+
+    :return: list of lists of paths (tuples of keys)
+    """
+
+    units = []
+    for key in differing_keys(base, other, depth):
+        baseValue = get_parameter(base, key) if key_exists(base, key) else MISSING
+        otherValue = get_parameter(other, key) if key_exists(other, key) else MISSING
+        names = added_or_removed(baseValue, otherValue)
+        if baseValue is MISSING or otherValue is MISSING:
+            names.add(key[-1])
+        linked = [unit for unit in units if unit[1] & names]
+        units = [unit for unit in units if not unit[1] & names]
+        units.append((sum([unit[0] for unit in linked], []) + [key], names.union(*[unit[1] for unit in linked])))
+    return sorted(sorted(keys) for keys, names in units)
+
+
+def substituted(base, other, keys):
+    """
+    :return: a copy of base with the values of other under each of keys (removed where other has none)
+    """
+
+    model = copy.deepcopy(base)
+    for key in keys:
+        value = get_parameter(other, key) if key_exists(other, key) else MISSING
+        parent = get_parameter(model, key[:-1]) if len(key) > 1 else model
+        if value is MISSING:
+            parent.pop(key[-1], None)
+        else:
+            parent[key[-1]] = copy.deepcopy(value)
+    return model
+
+
+def key_exists(model, key):
+    try:
+        get_parameter(model, key)
+    except (KeyError, IndexError):
+        return False
+    return True
+
+
+def attribution(base, other, years, depth=1, method='sequential'):
+    """
+    Attribute the change in total CPU, disk and tape between two configurations to the keys that differ
+
+    :param base: The baseline configuration dictionary
+    :param other: The configuration dictionary compared with it
+    :param years: Years to consider
+    :param depth: how many levels of keys to go down
+    :param method: 'sequential' or 'shapley'
+    :return: list of keys ('/' separated, linked keys joined by '+') and numpy array (key, year, resource) of their
+             contributions
+    """
+
+    units = linked_keys(base, other, depth)
+    if method == 'sequential':
+        coalitions = [list(range(size)) for size in range(len(units) + 1)]
+    elif method == 'shapley':
+        if len(units) > MAX_SHAPLEY_KEYS:
+            raise ValueError('%d keys differ, too many for Shapley attribution (at most %d), use sequential or a '
+                             'smaller depth' % (len(units), MAX_SHAPLEY_KEYS))
+        coalitions = [list(subset) for size in range(len(units) + 1)
+                      for subset in itertools.combinations(range(len(units)), size)]
+    else:
+        raise ValueError('Unknown attribution method %r' % method)
+
+    models = [substituted(base, other, [key for unit in coalition for key in units[unit]]) for coalition in coalitions]
+    values, components = aligned(batched_breakdowns(models, years))
+    value = dict((tuple(coalition), total) for coalition, total in zip(coalitions, totals(values, components)))
+
+    contributions = np.zeros((len(units),) + values.shape[1:2] + (len(RESOURCES),))
+    for unit in range(len(units)):
+        if method == 'sequential':
+            contributions[unit] = value[tuple(range(unit + 1))] - value[tuple(range(unit))]
+            continue
+        for coalition in coalitions:
+            if unit in coalition:
+                continue
+            weight = (math.factorial(len(coalition)) * math.factorial(len(units) - len(coalition) - 1) /
+                      math.factorial(len(units)))
+            contributions[unit] += weight * (value[tuple(sorted(coalition + [unit]))] - value[tuple(coalition)])
+    return ['+'.join(parameter_name(key) for key in keys) for keys in units], contributions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare configurations and attribute the differences')
+    parser.add_argument('configurations', nargs='+', help='comma separated lists of configuration files, the first '
+                                                          'one is the baseline')
+    parser.add_argument('--depth', type=int, default=1, help='levels of configuration keys to attribute to')
+    parser.add_argument('--method', choices=['sequential', 'shapley'], default='shapley')
+    parser.add_argument('--year', type=int, default=None, help='year to show the details of, defaults to the last')
+    args = parser.parse_args()
+
+    names = args.configurations
+    models = [configure([fileName for fileName in name.split(',') if fileName]) for name in names]
+    years = [year for year in model_years(models[0]) if all(year in model_years(model) for model in models[1:])]
+    detailYear = args.year or years[-1]
+    detail = years.index(detailYear)
+
+    values, components = aligned(batched_breakdowns(models, years))
+    resourceTotals = totals(values, components)
+
+    for position, (resource, scale, unit) in enumerate(RESOURCES):
+        print('\n%s required in %s, difference to %s' % (resource.capitalize(), unit, names[0]))
+        print('Year ' + ' '.join(names))
+        for index, year in enumerate(years):
+            base = resourceTotals[0, index, position]
+            print(year, '{:.1f}'.format(base / scale),
+                  ' '.join('{:+.1f}'.format((other[index, position] - base) / scale) for other in resourceTotals[1:]))
+
+    print('\nBy activity and tier in %d, difference to %s' % (detailYear, names[0]))
+    print('Component ' + ' '.join(names))
+    for index, component in enumerate(components):
+        scale = dict((resource, scale) for resource, scale, unit in RESOURCES)[component.split('/')[0]]
+        base = values[0, detail, index]
+        print(component, '{:.1f}'.format(base / scale),
+              ' '.join('{:+.1f}'.format((other[detail, index] - base) / scale) for other in values[1:]))
+
+    with open('Compare.csv', 'w') as compareFile:
+        writer = csv.writer(compareFile)
+        writer.writerow(['configuration', 'year', 'component', 'baseline', 'value', 'difference'])
+        for model, name in enumerate(names[1:], 1):
+            for index, year in enumerate(years):
+                for position, component in enumerate(components):
+                    writer.writerow([name, year, component, values[0, index, position], values[model, index, position],
+                                     values[model, index, position] - values[0, index, position]])
+
+    with open('Attribution.csv', 'w') as attributionFile:
+        writer = csv.writer(attributionFile)
+        writer.writerow(['configuration', 'method', 'key', 'year', 'resource', 'contribution'])
+        for model, name in enumerate(names[1:], 1):
+            keys, contributions = attribution(models[0], models[model], years, args.depth, args.method)
+            print('\n%s attribution of the difference between %s and %s in %d' %
+                  (args.method.capitalize(), name, names[0], detailYear))
+            print('Key ' + ' '.join('%s (%s)' % (resource, unit) for resource, scale, unit in RESOURCES))
+            for index, key in enumerate(keys):
+                print(key, ' '.join('{:+.1f}'.format(contributions[index, detail, position] / scale)
+                                    for position, (resource, scale, unit) in enumerate(RESOURCES)))
+                for yearIndex, year in enumerate(years):
+                    for position, (resource, scale, unit) in enumerate(RESOURCES):
+                        writer.writerow([name, args.method, key, year, resource,
+                                         contributions[index, yearIndex, position]])
+            print('Total', ' '.join('{:+.1f}'.format(contributions[:, detail, position].sum() / scale)
+                                    for position, (resource, scale, unit) in enumerate(RESOURCES)))
@@ -12,13 +12,17 @@ Load the model parameters from two JSON files
 import json
 from collections import namedtuple
 
+import numpy as np
+
 from utils import time_dependent_value
 
 SECONDS_PER_YEAR = 365.25 * 24 * 3600
 
+RunModel = namedtuple('RunModel', 'events, in_shutdown')
+
 
 def configure(modelName):
-    modelNames = ['BaseModel.json', 'RealisticModel.json']
+    modelNames = ['BaseModel.json', 'RealisticModel.json', 'SiteModel.json']
 
     if isinstance(modelName, basestring):
         modelNames.append(modelName)
@@ -27,6 +31,9 @@ def configure(modelName):
 
     model = {}
     for modelName in modelNames:
+        if isinstance(modelName, dict):  # An override document already loaded
+            model.update(modelName)
+            continue
         with open(modelName, 'r') as modelFile:
             modelChanges = json.load(modelFile)
             model.update(modelChanges)
@@ -34,6 +41,51 @@ def configure(modelName):
     return model
 
 
+def parameter_path(model, name):
+    """
+    :param model: The configuration dictionary
+    :param name: '/' separated keys to a value, e.g. 'storage_model/disk_replicas/AOD/0'
+    :return: tuple of keys, with list indices as integers
+    """
+
+    path = []
+    value = model
+    for key in name.split('/'):
+        if isinstance(value, list):
+            key = int(key)
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            raise KeyError('No parameter %r in the model (stopped at %r)' % (name, key))
+        path.append(key)
+    return tuple(path)
+
+
+def parameter_name(path):
+    return '/'.join(str(key) for key in path)
+
+
+def get_parameter(model, path):
+    value = model
+    for key in path:
+        value = value[key]
+    return value
+
+
+def set_parameter(model, path, value):
+    container = get_parameter(model, path[:-1])
+    container[path[-1]] = value
+
+
+def model_years(model):
+    """
+    :param model: The configuration dictionary
+    :return: list of years from start_year through end_year
+    """
+
+    return list(range(model['start_year'], model['end_year'] + 1))
+
+
 def in_shutdown(model, year):
     """
     :param model: The configuration dictionary
@@ -57,8 +109,6 @@ def run_model(model, year, data_type='data'):
     :return: data events, in_shutdown
     """
 
-    RunModel = namedtuple('RunModel', 'events, in_shutdown')
-
     inShutdown, lastRunningYear = in_shutdown(model, year)
     events = 0
     if not inShutdown:
@@ -66,7 +116,7 @@ def run_model(model, year, data_type='data'):
         liveFraction, basisYear = time_dependent_value(year, model['live_fraction'])
         events = SECONDS_PER_YEAR * liveFraction * triggerRate
     if data_type == 'mc':
-        events *= model['mc_event_factor']
+        events = events * model['mc_event_factor']
     return RunModel(events, inShutdown)
 
 
@@ -98,7 +148,7 @@ def mc_event_model(model, year):
             futureEvents = run_model(model, mcYear).events
         else:
             futureEvents = 0
-        dataEvents = max(currEvents, lastEvents, futureEvents)
+        dataEvents = np.maximum(np.maximum(currEvents, lastEvents), futureEvents)  # Elementwise for batches
 
         # TODO: Replace this bit of code with interpolate_value from utils.py
         pastYear = 0
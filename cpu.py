@@ -16,8 +16,10 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import json
-from configure import configure, run_model, mc_event_model, in_shutdown
-from performance import performance_by_year
+from capacity import capacity_model
+from activities import cpu_requirements
+from configure import configure
+from sites import allocate, group_share, print_by_role, site_capacity
 
 # Basic parameters
 kilo = 1000
@@ -37,146 +39,25 @@ model = configure(modelNames)
 # The very important list of years
 YEARS = list(range(model['start_year'], model['end_year']+1))
 
-# Get the performance year by year which includes the software improvement factor
-reco_time = {year: performance_by_year(model, year, 'RECO', data_type='data')[0] for year in YEARS}
+# CPU requirements by activity, see activities.py for the assumptions
+cpuByActivity, cpuTimeByActivity = cpu_requirements(model, YEARS)
 
-lhc_sim_time = {year: performance_by_year(model, year, 'GENSIM',
-                                              data_type='mc', kind='2017')[0] +
-                  performance_by_year(model, year, 'DIGI',
-                                          data_type='mc', kind='2017')[0] +
-                  performance_by_year(model, year, 'RECO',
-                                          data_type='mc', kind='2017')[0] for year in YEARS}
 
-hllhc_sim_time = {year: performance_by_year(model, year, 'GENSIM',
-                                            data_type='mc', kind='2026')[0] +
-                        performance_by_year(model, year, 'DIGI',
-                                            data_type='mc', kind='2026')[0] +
-                        performance_by_year(model, year, 'RECO',
-                                            data_type='mc', kind='2026')[0] for year in YEARS}
+def by_year(labeled, activity):
+    return dict(zip(YEARS, labeled.select(activity=activity).values))
 
-# general pattern:
-# _required: HS06
-# _time: HS06s
 
-# CPU time requirement calculations, in HS06 * s
-# Take the running time and event rate from the model
-
-data_events = {i: run_model(model, i, data_type='data').events for i in YEARS}
-
-lhc_mc_events = {i: mc_event_model(model, i)['2017'] for i in YEARS}
-hllhc_mc_events = {i: mc_event_model(model, i)['2026'] for i in YEARS}
-
-#Note the quantity below is for prompt reco only.
-data_cpu_time = {i : data_events[i] * reco_time[i] for i in YEARS}
-
-lhc_mc_cpu_time = {i : lhc_mc_events[i] * lhc_sim_time[i] for i in YEARS}
-hllhc_mc_cpu_time = {i : hllhc_mc_events[i] * hllhc_sim_time[i] for i in YEARS}
-
-# The data need to be reconstructed about as quickly as we record them.  In
-# addition, we need to factor in express, repacking, AlCa, CAF
-# functionality and skimming.  Presumably these all scale like the data.
-# Per the latest CRSG document, these total to 123 kHS06 compared to 240
-# kHS016 for the prompt reconstruction, which we can round to 50%, so
-# multiply by 50%.  (Ignoring the 10 kHS06 needed for VO boxes, which
-# won't scale up and is also pretty small.)
-
-data_cpu_required = {i : (1.5 * data_cpu_time[i] / running_time)
-                         for i in YEARS}
-
-# Also keep using the _time variables to sum up the total HS06 * s needed,
-# which frees us from assumptions on time needed to complete the work.
-
-data_cpu_time = {i : 1.5 * data_cpu_time[i] for i in YEARS}
-
-# In-year reprocessing model: assume we will re-reco 25% of the data each
-# year, but we want to complete it in one month.  We also re-reco 25% of
-# the previous year's data (assumed to be the same number of events as this
-# year) but we want to do that in three months.
-
-rereco_cpu_required = {i : max(0.25 * data_events[i] * reco_time[i]/ seconds_per_month,
-                                data_events[i] * reco_time[i] / (3 * seconds_per_month))
-                         for i in YEARS}
-
-# But the total time needed is the sum of both activities.
-    
-rereco_cpu_time = {i : (1.25 * data_events[i] * reco_time[i]) for i in YEARS}
-    
-# The corresponding MC, on the other hand, can be reconstructed over an
-# entire year.  We can use this to calculate the HS06 needed to do those
-# tasks.
-
-lhc_mc_cpu_required = {i : lhc_mc_cpu_time[i] / seconds_per_year for i in YEARS}
-hllhc_mc_cpu_required = {i : hllhc_mc_cpu_time[i] / seconds_per_year for i in YEARS}
-
-# Unless it is a year with new detectors in, in which case we will have
-# less time to make MC (say half as much).  Only applies to the current
-# era, i.e. no need to compress HL-LHC MC when we are still in LHC era.
-
-for i in YEARS:
-    if (i in model['new_detector_years']):
-        if i < 2026:
-            lhc_mc_cpu_required[i] = lhc_mc_cpu_time[i]/ (seconds_per_year / 2)
-        else:
-            hllhc_mc_cpu_required[i] = hllhc_mc_cpu_time[i]/ (seconds_per_year / 2)
-            
-
-# Analysis!  Following something like the 2018 resource request, we make this
-# 75% of everything else (for a moment).
-
-analysis_cpu_required = {i : 0.75 *
-                             (lhc_mc_cpu_required[i] + hllhc_mc_cpu_required[i] +
-                             data_cpu_required[i] + rereco_cpu_required[i])
-                             for i in YEARS}
-
-analysis_cpu_time = {i : 0.75* (data_cpu_time[i] + rereco_cpu_time[i] +
-                         lhc_mc_cpu_time[i] + hllhc_mc_cpu_time[i])
-                         for i in YEARS}
-
-# But do something a little funkier for the time up to HL-LHC.  We are
-# accumulating data, so analysis should keep taking longer.  Assume 2018 is
-# "right".  In 2019 we will analyze 2018 data in addition to 2016 and 2017,
-# so make 2019 1/3 bigger.  Keep the same amount through the shutdown when
-# we don't accumulate data.  Then after the shutdown we keep adding in data
-# years that are the same size as the previous ones, and then keep that
-# flat until we ramp up HL-LHC studies in 2025 and we revert back to the
-# 75% model.  Implemented here as a complete kludge.  Note that by kludging
-# this way we don't absorb the software improvement factors...but that's
-# OK, the analysis is I/O bound anyway and doesn't benefit from such
-# improvements.
-
-analysis_cpu_time[2019] = (4/3) * analysis_cpu_time[2018]
-analysis_cpu_time[2020] = analysis_cpu_time[2019]
-analysis_cpu_time[2021] = analysis_cpu_time[2019]
-analysis_cpu_time[2022] = (5/4)* analysis_cpu_time[2021]
-analysis_cpu_time[2023] = (6/5)* analysis_cpu_time[2022]
-analysis_cpu_time[2024] = (7/6)* analysis_cpu_time[2023]
-
-# More kludging: assume analysis takes place all year to calculate the HS06
-# required for the above analysis CPU time.  Eric will hate this, I do too,
-# we should fix it up later.
-
-for i in YEARS:
-    if (i >= 2019 and i < 2025):
-        analysis_cpu_required[i] = analysis_cpu_time[i]/seconds_per_year
-
-# Shutdown year model:
-
-# If in the first year of a shutdown, need to reconstruct the previous
-# three years of data, but you have all year to do it.  No need for all the
-# ancillary stuff.  We need to do the MC also...assume similarly that we
-# have three times as many events as we had the previous year.
-
-for i in YEARS:
-    shutdown_this_year, dummy = in_shutdown(model,i)
-    shutdown_last_year, dummy = in_shutdown(model,i-1)
-    if (shutdown_this_year and not(shutdown_last_year)):
-        data_events[i] = 3 * data_events[i-1]
-        rereco_cpu_time[i] = data_events[i] * reco_time[i]
-        rereco_cpu_required[i] = rereco_cpu_time[i] / seconds_per_year
-        lhc_mc_events[i] = 3 * lhc_mc_events[i-1]
-        lhc_mc_cpu_time[i] = lhc_mc_events[i] * lhc_sim_time[i]
-        lhc_mc_cpu_required[i] = lhc_mc_cpu_time[i] / seconds_per_year
+data_cpu_required = by_year(cpuByActivity, 'Prompt Data')
+rereco_cpu_required = by_year(cpuByActivity, 'Non-Prompt Data')
+lhc_mc_cpu_required = by_year(cpuByActivity, 'LHC MC')
+hllhc_mc_cpu_required = by_year(cpuByActivity, 'HL-LHC MC')
+analysis_cpu_required = by_year(cpuByActivity, 'Analysis')
 
+data_cpu_time = by_year(cpuTimeByActivity, 'Prompt Data')
+rereco_cpu_time = by_year(cpuTimeByActivity, 'Non-Prompt Data')
+lhc_mc_cpu_time = by_year(cpuTimeByActivity, 'LHC MC')
+hllhc_mc_cpu_time = by_year(cpuTimeByActivity, 'HL-LHC MC')
+analysis_cpu_time = by_year(cpuTimeByActivity, 'Analysis')
 
 # Sum up everything
 
@@ -231,39 +112,21 @@ del cpu_time_capacity[2016]
 
 # CPU capacity model ala data.py
 
-# Set the initial points
-cpuCapacity = {str(model['capacity_model']['cpu_year']): model['capacity_model']['cpu_start']}
-cpuTimeCapacity = {str(model['capacity_model']['cpu_year']): model['capacity_model']['cpu_start'] * seconds_per_year}
+cpuCapacity = {str(year): capacity for year, capacity in zip(YEARS, capacity_model(model, 'cpu', YEARS))}
+cpuTimeCapacity = {year: capacity * seconds_per_year for year, capacity in cpuCapacity.items()}
 
+# Split the requirements among sites
 
-# A bit of a kludge. Assume what we have now was bought and will be retired in equal chunks over its lifetime
-cpuAdded = {}
-for year in range(model['capacity_model']['cpu_year'] - model['capacity_model']['cpu_lifetime'] + 1,
-                  model['capacity_model']['cpu_year'] + 1):
-    retired = model['capacity_model']['cpu_start'] / model['capacity_model']['cpu_lifetime']
-    cpuAdded[str(year)] = retired
+cpuBySite = allocate(model, 'cpu', cpuByActivity).sum('activity')
+cpuTimeBySite = allocate(model, 'cpu', cpuTimeByActivity).sum('activity')
+cpuCapacityBySite = site_capacity(model, 'cpu', [cpuCapacity[str(i)] for i in YEARS], YEARS)
 
-cpuFactor = model['improvement_factors']['hardware']
-
-for year in YEARS:
-    if str(year) not in cpuCapacity:
-        cpuDelta = 0  # Find the delta which can be time dependant
-        cpuDeltas = model['capacity_model']['cpu_delta']
-        for deltaYear in sorted(cpuDeltas.keys()):
-            if int(year) >= int(deltaYear):
-                lastCpuYear = int(deltaYear)
-                cpuDelta = model['capacity_model']['cpu_delta'][deltaYear]
-
-        cpuAdded[str(year)] = cpuDelta * cpuFactor ** (int(year) - int(lastCpuYear))
-
-        # Retire cpu added N years ago or retire 0
-
-        cpuRetired = cpuAdded.get(str(int(year) - model['capacity_model']['cpu_lifetime']), 0)
-        cpuCapacity[str(year)] = cpuCapacity[str(int(year) - 1)] + cpuAdded[str(year)] - cpuRetired
-        cpuTimeCapacity[str(year)] = cpuCapacity[str(year)] * seconds_per_year
+group_cpu_required = dict(zip(YEARS, group_share(model, cpuBySite)))
+group_cpu_time = dict(zip(YEARS, group_share(model, cpuTimeBySite)))
+groupName = model['site_model']['report_group'] + 'CMS'
 
 print("CPU requirements in HS06")
-print("Year Prompt NonPrompt LHCMC HLLHCMC Ana Total Cap1 Cap2 Ratio USCMS HPC")
+print("Year Prompt NonPrompt LHCMC HLLHCMC Ana Total Cap1 Cap2 Ratio " + groupName + " HPC")
 for i in YEARS:
     print(i, '{:04.3f}'.format(data_cpu_required[i] / mega),
     '{:04.3f}'.format(rereco_cpu_required[i] / mega),
@@ -274,12 +137,12 @@ for i in YEARS:
     '{:04.3f}'.format(cpu_capacity[i] / mega),
     '{:04.3f}'.format(cpuCapacity[str(i)] / mega), 'MHS06',
     '{:04.3f}'.format(total_cpu_required[i]/cpuCapacity[str(i)]),
-    '{:04.3f}'.format(0.4* (total_cpu_required[i]) / mega),
+    '{:04.3f}'.format(group_cpu_required[i] / mega),
     '{:04.3f}'.format(hpc_cpu_required[i]/total_cpu_required[i])
               )
 
 print("CPU requirements in HS06 * s")
-print("Year Prompt NonPrompt LHCMC HLLHCMC Ana Total Cap1 Cap2 Ratio USCMS HPC")
+print("Year Prompt NonPrompt LHCMC HLLHCMC Ana Total Cap1 Cap2 Ratio " + groupName + " HPC")
 for i in YEARS:
     print(i, '{:03.2f}'.format(data_cpu_time[i] / tera),
     '{:03.2f}'.format(rereco_cpu_time[i] / tera),
@@ -290,10 +153,14 @@ for i in YEARS:
     '{:03.2f}'.format(cpu_time_capacity[i] / tera),
     '{:03.2f}'.format(cpuTimeCapacity[str(i)] / tera), 'THS06 * s',
     '{:03.2f}'.format(total_cpu_time[i] / cpuTimeCapacity[str(i)]),
-    '{:03.2f}'.format(0.4* (total_cpu_time[i]) / tera),
+    '{:03.2f}'.format(group_cpu_time[i] / tera),
     '{:03.2f}'.format(hpc_cpu_time[i]/total_cpu_time[i])
               )
 
+print_by_role(model, "CPU requirements and capacity by site role in MHS06", cpuBySite, cpuCapacityBySite, mega)
+
+pd.DataFrame(cpuBySite.values / mega, index=YEARS, columns=cpuBySite.labels[1]).to_csv('CPU by Site.csv')
+
 
 # Plot the HS06
 
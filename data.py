@@ -13,10 +13,15 @@ import json
 import sys
 from collections import defaultdict
 
-from configure import configure, in_shutdown, mc_event_model, run_model
+import numpy as np
+import pandas as pd
+
+from capacity import capacity_model
+from configure import configure
+from labeled import LabeledArray
 from plotting import plotStorage, plotStorageWithCapacity
-from utils import time_dependent_value
-from performance import performance_by_year
+from sites import allocate, group_share, print_by_role, site_capacity
+from storage import data_on_media, data_on_media_by_cohort, data_produced, static_data
 
 PETA = 1e15
 
@@ -30,175 +35,69 @@ TIERS = list(model['tier_sizes'].keys())
 STATIC_TIERS = list(sorted(set(model['static_disk'].keys() + model['static_tape'].keys())))
 
 # Build the capacity model
-
-# Set the initial points
-diskCapacity = {str(model['capacity_model']['disk_year']): model['capacity_model']['disk_start']}
-tapeCapacity = {str(model['capacity_model']['tape_year']): model['capacity_model']['tape_start']}
-
-# A bit of a kludge. Assume what we have now was bought and will be retired in equal chunks over its lifetime
-diskAdded = {}
-tapeAdded = {}
-for year in range(model['capacity_model']['disk_year'] - model['capacity_model']['disk_lifetime'] + 1,
-                  model['capacity_model']['disk_year'] + 1):
-    retired = model['capacity_model']['disk_start'] / model['capacity_model']['disk_lifetime']
-    diskAdded[str(year)] = retired
-for year in range(model['capacity_model']['tape_year'] - model['capacity_model']['tape_lifetime'] + 1,
-                  model['capacity_model']['tape_year'] + 1):
-    retired = model['capacity_model']['tape_start'] / model['capacity_model']['tape_lifetime']
-    tapeAdded[str(year)] = retired
-
-diskFactor = model['improvement_factors']['disk']
-tapeFactor = model['improvement_factors']['tape']
-
-for year in YEARS:
-    if str(year) not in diskCapacity:
-        diskDelta = 0  # Find the delta which can be time dependant
-        tapeDelta = 0  # Find the delta which can be time dependant
-        diskDeltas = model['capacity_model']['disk_delta']
-        tapeDeltas = model['capacity_model']['tape_delta']
-        for deltaYear in sorted(diskDeltas.keys()):
-            if int(year) >= int(deltaYear):
-                lastDiskYear = int(deltaYear)
-                diskDelta = model['capacity_model']['disk_delta'][deltaYear]
-        for deltaYear in sorted(tapeDeltas.keys()):
-            if int(year) >= int(deltaYear):
-                lastTapeYear = int(deltaYear)
-                tapeDelta = model['capacity_model']['tape_delta'][deltaYear]
-
-        diskAdded[str(year)] = diskDelta * diskFactor**(int(year) - int(lastDiskYear))
-        tapeAdded[str(year)] = tapeDelta * tapeFactor**(int(year) - int(lastTapeYear))
-        # Retire disk/tape added N years ago or retire 0
-
-        diskRetired = diskAdded.get(str(int(year) - model['capacity_model']['disk_lifetime']), 0)
-        tapeRetired = tapeAdded.get(str(int(year) - model['capacity_model']['tape_lifetime']), 0)
-        diskCapacity[str(year)] = diskCapacity[str(int(year) - 1)] + diskAdded[str(year)] - diskRetired
-        tapeCapacity[str(year)] = tapeCapacity[str(int(year) - 1)] + tapeAdded[str(year)] - tapeRetired
+diskCapacity = {str(year): capacity for year, capacity in zip(YEARS, capacity_model(model, 'disk', YEARS))}
+tapeCapacity = {str(year): capacity for year, capacity in zip(YEARS, capacity_model(model, 'tape', YEARS))}
 
 # Disk space used
-dataProduced = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))  # dataProduced[year][type][tier]
-dataOnDisk = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))  # dataOnDisk[year][type][tier]
-dataOnTape = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))  # dataOnTape[year][type][tier]
+dataProduced = data_produced(model, YEARS)  # dataProduced[producedYear, dataType, tier]
+dataOnDisk = data_on_media(model, dataProduced, 'disk')  # dataOnDisk[year, dataType, tier]
+dataOnTape = data_on_media(model, dataProduced, 'tape')  # dataOnTape[year, dataType, tier]
+diskByCohort = data_on_media_by_cohort(model, dataProduced, 'disk')  # diskByCohort[year, producedYear, dataType, tier]
+tapeByCohort = data_on_media_by_cohort(model, dataProduced, 'tape')
+staticDisk = static_data(model, 'disk', YEARS)  # staticDisk[year, producedYear, tier]
+staticTape = static_data(model, 'tape', YEARS)
+
+# Tuples of all the data on tape and disk in a given year
 diskSamples = defaultdict(list)
 tapeSamples = defaultdict(list)
-
-diskCopies = {}
-tapeCopies = {}
-for tier in TIERS:
-    diskCopies[tier] = [versions * replicas for versions, replicas in
-                        zip(model['storage_model']['versions'][tier], model['storage_model']['disk_replicas'][tier])]
-    # Assume we have the highest number of versions in year 1, save n replicas of that
-    tapeCopies[tier] = model['storage_model']['versions'][tier][0] * model['storage_model']['tape_replicas'][tier]
-    if not tapeCopies[tier]: tapeCopies[tier] = [0, 0, 0]
-
-# Loop over years to determine how much is produced without versions or replicas
-for year in YEARS:
-    for tier in TIERS:
-        if tier not in model['mc_only_tiers']:
-            dummyCPU, tierSize = performance_by_year(model, year, tier, data_type='data')
-            dataProduced[year]['data'][tier] += tierSize * run_model(model, year, data_type='data').events
-        if tier not in model['data_only_tiers']:
-            mcEvents = mc_event_model(model, year)
-            for kind, events in mcEvents.items():
-                dummyCPU, tierSize = performance_by_year(model, year, tier, data_type='mc', kind=kind)
-                dataProduced[year]['mc'][tier] += tierSize * events
-
-producedByTier = [[0 for _i in range(len(TIERS))] for _j in YEARS]
-for year, dataDict in dataProduced.items():
-    for dataType, tierDict in dataDict.items():
-        for tier, size in tierDict.items():
-            producedByTier[YEARS.index(year)][TIERS.index(tier)] += size / PETA
-
-# Initialize a matrix with tiers and years
-YearColumns = YEARS + ['Capacity', 'Year', 'Run1 & 2']  # Add capacity, years as columns for data frame
-
-# Initialize a matrix with years and years
-diskByYear = [[0 for _i in YearColumns] for _j in YEARS]
-tapeByYear = [[0 for _i in YearColumns] for _j in YEARS]
-
-# Loop over years to determine how much is saved
-for year in YEARS:
-    # Add static (or nearly) data
-    for tier, spaces in model['static_disk'].items():
-        size, producedYear = time_dependent_value(year=year, values=spaces)
-        dataOnDisk[year]['Other'][tier] += size
-        diskSamples[year].append([producedYear, 'Other', tier, size])
-        diskByYear[YEARS.index(year)][YEARS.index(producedYear)] += size / PETA
-    for tier, spaces in model['static_tape'].items():
-        size, producedYear = time_dependent_value(year=year, values=spaces)
-        dataOnTape[year]['Other'][tier] += size
-        tapeSamples[year].append([producedYear, 'Other', tier, size])
-        tapeByYear[YEARS.index(year)][YEARS.index(producedYear)] += size / PETA
-
-    # Figure out data from this year and previous
-    for producedYear, dataDict in dataProduced.items():
-        for dataType, tierDict in dataDict.items():
-            for tier, size in tierDict.items():
-                diskCopiesByDelta = diskCopies[tier]
-                tapeCopiesByDelta = tapeCopies[tier]
-                if int(producedYear) <= int(year):  # Can't save data for future years
-                    if year - producedYear >= len(diskCopiesByDelta):
-                        revOnDisk = diskCopiesByDelta[-1]  # Revisions = versions * copies
-                        revOnTape = tapeCopiesByDelta[-1]  # Assume what we have for the last year is good for out years
-                    elif in_shutdown(model, year):
-                        inShutdown, lastRunningYear = in_shutdown(model, year)
-                        revOnDisk = diskCopiesByDelta[lastRunningYear - producedYear]
-                        revOnTape = tapeCopiesByDelta[lastRunningYear - producedYear]
-                    else:
-                        revOnDisk = diskCopiesByDelta[year - producedYear]
-                        revOnTape = tapeCopiesByDelta[year - producedYear]
-                    if size and revOnDisk:
-                        dataOnDisk[year][dataType][tier] += size * revOnDisk
-                        diskSamples[year].append([producedYear, dataType, tier, size * revOnDisk, revOnDisk])
-                        diskByYear[YEARS.index(year)][YEARS.index(producedYear)] += size * revOnDisk / PETA
-                    if size and revOnTape:
-                        dataOnTape[year][dataType][tier] += size * revOnTape
-                        tapeSamples[year].append([producedYear, dataType, tier, size * revOnTape, revOnTape])
-                        tapeByYear[YEARS.index(year)][YEARS.index(producedYear)] += size * revOnTape / PETA
-
-    # Add capacity numbers
-    diskByYear[YEARS.index(year)][YearColumns.index('Capacity')] = diskCapacity[str(year)] / PETA
-    diskByYear[YEARS.index(year)][YearColumns.index('Year')] = str(year)
-    tapeByYear[YEARS.index(year)][YearColumns.index('Capacity')] = tapeCapacity[str(year)] / PETA
-    tapeByYear[YEARS.index(year)][YearColumns.index('Year')] = str(year)
-
-# Initialize a matrix with tiers and years
-# Add capacity, years, and fake tiers as columns for the data frame
-TierColumns = TIERS + ['Capacity', 'Year'] + STATIC_TIERS
-
-diskByTier = [[0 for _i in range(len(TierColumns))] for _j in YEARS]
-tapeByTier = [[0 for _i in range(len(TierColumns))] for _j in YEARS]
-for year, dataDict in dataOnDisk.items():
-    for dataType, tierDict in dataDict.items():
-        for tier, size in tierDict.items():
-            diskByTier[YEARS.index(year)][TierColumns.index(tier)] += size / PETA
-    diskByTier[YEARS.index(year)][TierColumns.index('Capacity')] = diskCapacity[str(year)] / PETA
-    diskByTier[YEARS.index(year)][TierColumns.index('Year')] = str(year)
-for year, dataDict in dataOnTape.items():
-    for dataType, tierDict in dataDict.items():
-        for tier, size in tierDict.items():
-            tapeByTier[YEARS.index(year)][TierColumns.index(tier)] += size / PETA
-    tapeByTier[YEARS.index(year)][TierColumns.index('Capacity')] = tapeCapacity[str(year)] / PETA
-    tapeByTier[YEARS.index(year)][TierColumns.index('Year')] = str(year)
-
-diskByTier[YEARS.index(2017)][TierColumns.index('Run1 & 2')] = 25
-diskByTier[YEARS.index(2018)][TierColumns.index('Run1 & 2')] = 10
-diskByTier[YEARS.index(2019)][TierColumns.index('Run1 & 2')] = 5
-diskByTier[YEARS.index(2020)][TierColumns.index('Run1 & 2')] = 0
-
-diskByYear[YEARS.index(2017)][YearColumns.index('Run1 & 2')] = 25
-diskByYear[YEARS.index(2018)][YearColumns.index('Run1 & 2')] = 10
-diskByYear[YEARS.index(2019)][YearColumns.index('Run1 & 2')] = 5
-diskByYear[YEARS.index(2020)][YearColumns.index('Run1 & 2')] = 0
+for samples, static, byCohort in [(diskSamples, staticDisk, diskByCohort), (tapeSamples, staticTape, tapeByCohort)]:
+    for indices in zip(*np.nonzero(static.values)):
+        year, producedYear, tier = [static.labels[axis][index] for axis, index in enumerate(indices)]
+        samples[year].append([producedYear, 'Other', tier, static.values[indices]])
+    for indices in zip(*np.nonzero(byCohort.values)):
+        year, producedYear, dataType, tier = [byCohort.labels[axis][index] for axis, index in enumerate(indices)]
+        size = byCohort.values[indices]
+        copies = size / dataProduced.get(producedYear=producedYear, dataType=dataType, tier=tier)
+        samples[year].append([producedYear, dataType, tier, size, copies])
+
+# Only now go to pandas, with years and tiers as the index and columns. Add capacity and years as columns as well
+producedByTier = dataProduced.sum('dataType').to_frame(scale=PETA)
+
+diskByYear = diskByCohort.sum('dataType', 'tier').to_frame(scale=PETA)
+diskByYear += staticDisk.sum('tier').to_frame(scale=PETA)
+tapeByYear = tapeByCohort.sum('dataType', 'tier').to_frame(scale=PETA)
+tapeByYear += staticTape.sum('tier').to_frame(scale=PETA)
+diskByTier = dataOnDisk.sum('dataType').to_frame(scale=PETA)
+tapeByTier = dataOnTape.sum('dataType').to_frame(scale=PETA)
+
+for frame, static in [(diskByTier, staticDisk), (tapeByTier, staticTape)]:
+    staticByTier = static.sum('producedYear').to_frame(scale=PETA)
+    for tier in STATIC_TIERS:
+        frame[tier] = staticByTier[tier] if tier in staticByTier else 0.0
+for frame in [diskByYear, diskByTier]:
+    frame['Capacity'] = [diskCapacity[str(year)] / PETA for year in YEARS]
+for frame in [tapeByYear, tapeByTier]:
+    frame['Capacity'] = [tapeCapacity[str(year)] / PETA for year in YEARS]
+for frame in [diskByYear, tapeByYear, diskByTier, tapeByTier]:
+    frame['Year'] = [str(year) for year in YEARS]
+for frame in [diskByYear, tapeByYear]:
+    frame['Run1 & 2'] = 0.0
+
+for frame in [diskByTier, diskByYear]:
+    frame.loc[2017, 'Run1 & 2'] = 25
+    frame.loc[2018, 'Run1 & 2'] = 10
+    frame.loc[2019, 'Run1 & 2'] = 5
+    frame.loc[2020, 'Run1 & 2'] = 0
 
 plotStorage(producedByTier, name='Produced by Tier.png', title='Data produced by tier', columns=TIERS, index=YEARS)
 
-plotStorageWithCapacity(tapeByTier, name='Tape by Tier.png', title='Data on tape by tier', columns=TierColumns,
+plotStorageWithCapacity(tapeByTier, name='Tape by Tier.png', title='Data on tape by tier',
                         bars=TIERS + STATIC_TIERS)
-plotStorageWithCapacity(diskByTier, name='Disk by Tier.png', title='Data on disk by tier', columns=TierColumns,
+plotStorageWithCapacity(diskByTier, name='Disk by Tier.png', title='Data on disk by tier',
                         bars=TIERS + STATIC_TIERS)
-plotStorageWithCapacity(tapeByYear, name='Tape by Year.png', title='Data on tape by year produced', columns=YearColumns,
+plotStorageWithCapacity(tapeByYear, name='Tape by Year.png', title='Data on tape by year produced',
                         bars=YEARS + ['Run1 & 2'])
-plotStorageWithCapacity(diskByYear, name='Disk by Year.png', title='Data on disk by year produced', columns=YearColumns,
+plotStorageWithCapacity(diskByYear, name='Disk by Year.png', title='Data on disk by year produced',
                         bars=YEARS + ['Run1 & 2'])
 
 # Dump out tuples of all the data on tape and disk in a given year
@@ -207,46 +106,41 @@ with open('disk_samples.json', 'w') as diskUsage, open('tape_samples.json', 'w')
     json.dump(tapeSamples, tapeUsage, sort_keys=True, indent=1)
 
 
-# disk printout
-print('\nDisk by tier printout in PB\n')
-header = "year"
-for column in TIERS + STATIC_TIERS:
-    header += ";"
-    header += str(column)
-header +=";total;40%"
-print(header)
-
-for year in YEARS:
-    line = str(year)
-    total = 0
-    for column in TIERS + STATIC_TIERS:
-        line += " " 
-        line += '{:8.2f}'.format(diskByTier[YEARS.index(year)][TierColumns.index(column)])
-        total += diskByTier[YEARS.index(year)][TierColumns.index(column)]
-    line += '{:8.2f}'.format(total)
-    line += '{:8.2f}'.format(total*0.4)
-    print(line)
-
+# Split among sites
+diskBySite = allocate(model, 'disk', LabeledArray([('year', YEARS), ('tier', TIERS + STATIC_TIERS)],
+                                                  diskByTier[TIERS + STATIC_TIERS].values * PETA)).sum('tier')
+tapeBySite = allocate(model, 'tape', LabeledArray([('year', YEARS), ('tier', TIERS + STATIC_TIERS)],
+                                                  tapeByTier[TIERS + STATIC_TIERS].values * PETA)).sum('tier')
+diskCapacityBySite = site_capacity(model, 'disk', [diskCapacity[str(year)] for year in YEARS], YEARS)
+tapeCapacityBySite = site_capacity(model, 'tape', [tapeCapacity[str(year)] for year in YEARS], YEARS)
+groupName = model['site_model']['report_group']
 
-# tape printout
-print('\nTape by tier printout in PB\n')
-header = "year"
-for column in TIERS + STATIC_TIERS:
-    header += ";"
-    header += str(column)
-header +=";total;40%"
-print(header)
+for name, byTier, bySite in [('Disk', diskByTier, diskBySite), ('Tape', tapeByTier, tapeBySite)]:
+    groupShare = group_share(model, bySite)
 
-for year in YEARS:
-    line = str(year)
-    total = 0
+    print('\n%s by tier printout in PB\n' % name)
+    header = "year"
     for column in TIERS + STATIC_TIERS:
-        line += " " 
-        line += '{:8.2f}'.format(tapeByTier[YEARS.index(year)][TierColumns.index(column)])
-        total += tapeByTier[YEARS.index(year)][TierColumns.index(column)]
-    line += '{:8.2f}'.format(total)
-    line += '{:8.2f}'.format(total*0.4)
-    print(line)
+        header += ";"
+        header += str(column)
+    header += ";total;" + groupName
+    print(header)
+
+    for year, share in zip(YEARS, groupShare):
+        line = str(year)
+        total = 0
+        for column in TIERS + STATIC_TIERS:
+            line += " "
+            line += '{:8.2f}'.format(byTier.loc[year, column])
+            total += byTier.loc[year, column]
+        line += '{:8.2f}'.format(total)
+        line += '{:8.2f}'.format(share / PETA)
+        print(line)
+
+for name, bySite, capacityBySite in [('Disk', diskBySite, diskCapacityBySite),
+                                     ('Tape', tapeBySite, tapeCapacityBySite)]:
+    print_by_role(model, '\n%s by site role printout in PB\n' % name, bySite, capacityBySite, PETA)
+    pd.DataFrame(bySite.values / PETA, index=YEARS, columns=bySite.labels[1]).to_csv('%s by Site.csv' % name)
 
 '''
 AOD:
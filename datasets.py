@@ -0,0 +1,164 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./datasets.py config1.json,config2.json,...,configN.json
+
+Bottom-up version of the storage model. Split the data produced each year into individual datasets, follow each of
+them through the versions/replicas lifecycle year by year, and count how many (and which) are on disk and on tape.
+
+Datasets are kept as a numpy record array. Once a dataset can no longer have a copy on disk or tape it is written to
+retired_datasets.bin (numpy records of DATASET_DTYPE) and dropped, so memory is bounded by the live datasets.
+"""
+
+from __future__ import division, print_function
+
+import sys
+
+import numpy as np
+
+from configure import configure, model_years
+from storage import data_on_media, data_produced, last_running_index, lifecycle_kernel
+
+PETA = 1e15
+
+DATASET_DTYPE = np.dtype([('id', np.int64), ('producedYear', np.int16), ('dataType', np.int8), ('tier', np.int8),
+                          ('size', np.float64)])
+
+
+def synthesize(produced, year, datasetModel, randomState, firstId):
+    """
+    Split what was produced in one year into datasets with log-normal sizes, scaled to add up to the aggregate
+
+    :param produced: LabeledArray from data_produced
+    :param year: The year the datasets are produced
+    :param datasetModel: dataset_model section of the configuration
+    :param randomState: numpy RandomState
+    :param firstId: id for the first new dataset
+    :return: record array of DATASET_DTYPE
+    """
+
+    tiers = produced.labels[produced.axis('tier')]
+    chunks = []
+    for dataType, dataTypeName in enumerate(produced.labels[produced.axis('dataType')]):
+        for tier, tierName in enumerate(tiers):
+            volume = produced.get(producedYear=year, dataType=dataTypeName, tier=tierName)
+            if volume <= 0:
+                continue
+            nDatasets = max(1, int(round(volume / datasetModel['dataset_size'][tierName])))
+            sizes = randomState.lognormal(0, datasetModel['size_sigma'], nDatasets)
+
+            chunk = np.empty(nDatasets, dtype=DATASET_DTYPE)
+            chunk['producedYear'] = year
+            chunk['dataType'] = dataType
+            chunk['tier'] = tier
+            chunk['size'] = sizes * volume / sizes.sum()
+            chunks.append(chunk)
+
+    datasets = np.concatenate(chunks) if chunks else np.empty(0, dtype=DATASET_DTYPE)
+    datasets['id'] = np.arange(firstId, firstId + len(datasets))
+    return datasets
+
+
+def retirement_age(kernels):
+    """
+    :param kernels: list of (tier, age) arrays of copies, one per medium
+    :return: numpy array by tier of the age from which there are no copies left anywhere (a large number if never)
+    """
+
+    anyCopies = np.any([kernel > 0 for kernel in kernels], axis=0)
+    nAges = anyCopies.shape[1]
+    lastAge = nAges - 1 - np.argmax(anyCopies[:, ::-1], axis=1)
+    return np.where(anyCopies[:, -1], np.iinfo(np.int32).max, np.where(anyCopies.any(axis=1), lastAge + 1, 0))
+
+
+def simulate(model, retiredFile=None):
+    """
+    Step the datasets through the lifecycle year by year
+
+    :param model: The configuration dictionary
+    :param retiredFile: open binary file to stream retired datasets to, or None to drop them
+    :return: dictionary of per year results: number of datasets and volume on disk and tape by tier, live and retired
+             dataset counts
+    """
+
+    years = model_years(model)
+    datasetModel = model['dataset_model']
+    produced = data_produced(model, years)
+    tiers = produced.labels[produced.axis('tier')]
+    nTiers = len(tiers)
+
+    diskKernel = np.array([lifecycle_kernel(model, tier, 'disk', len(years)) for tier in tiers])
+    tapeKernel = np.array([lifecycle_kernel(model, tier, 'tape', len(years)) for tier in tiers])
+    retireAge = retirement_age([diskKernel, tapeKernel])
+    lastRunning = last_running_index(model, years)
+
+    randomState = np.random.RandomState(datasetModel.get('seed', 0))
+    live = np.empty(0, dtype=DATASET_DTYPE)
+    nextId = 0
+    nRetired = 0
+
+    results = {key: np.zeros((len(years), nTiers)) for key in ['disk_count', 'tape_count', 'disk', 'tape']}
+    results['live'] = np.zeros(len(years), dtype=np.int64)
+    results['retired'] = np.zeros(len(years), dtype=np.int64)
+
+    for index, year in enumerate(years):
+        new = synthesize(produced, year, datasetModel, randomState, nextId)
+        nextId += len(new)
+        live = np.concatenate([live, new])
+
+        # Age in running years, frozen during shutdowns
+        age = np.maximum(lastRunning[index] - (live['producedYear'] - years[0]), 0)
+        diskCopies = diskKernel[live['tier'], age]
+        tapeCopies = tapeKernel[live['tier'], age]
+
+        results['disk_count'][index] = np.bincount(live['tier'], weights=diskCopies > 0, minlength=nTiers)
+        results['tape_count'][index] = np.bincount(live['tier'], weights=tapeCopies > 0, minlength=nTiers)
+        results['disk'][index] = np.bincount(live['tier'], weights=live['size'] * diskCopies, minlength=nTiers)
+        results['tape'][index] = np.bincount(live['tier'], weights=live['size'] * tapeCopies, minlength=nTiers)
+        results['live'][index] = len(live)
+
+        # Stream out what will never be stored again
+        retired = age >= retireAge[live['tier']]
+        if retired.any():
+            if retiredFile is not None:
+                live[retired].tofile(retiredFile)
+            nRetired += retired.sum()
+            live = live[~retired]
+        results['retired'][index] = nRetired
+
+    return results
+
+
+if __name__ == '__main__':
+    modelNames = None
+    if len(sys.argv) > 1:
+        modelNames = sys.argv[1].split(',')
+    model = configure(modelNames)
+
+    YEARS = model_years(model)
+    with open('retired_datasets.bin', 'wb') as retiredFile:
+        results = simulate(model, retiredFile)
+
+    dataProduced = data_produced(model, YEARS)
+    TIERS = dataProduced.labels[dataProduced.axis('tier')]
+    aggregate = {medium: data_on_media(model, dataProduced, medium).sum('dataType').values
+                 for medium in ['disk', 'tape']}
+
+    for medium in ['disk', 'tape']:
+        print('\nDatasets on %s by tier\n' % medium)
+        print('year;' + ';'.join(TIERS) + ';total;PB;aggregate PB')
+        for index, year in enumerate(YEARS):
+            counts = results[medium + '_count'][index]
+            print(year, ' '.join('{:8d}'.format(int(count)) for count in counts), '{:9d}'.format(int(counts.sum())),
+                  '{:9.2f}'.format(results[medium][index].sum() / PETA),
+                  '{:9.2f}'.format(aggregate[medium][index].sum() / PETA))
+
+    print('\nDatasets in memory and retired\n')
+    print('year;live;retired')
+    for index, year in enumerate(YEARS):
+        print(year, results['live'][index], results['retired'][index])
+
+    for medium in ['disk', 'tape']:
+        scale = np.maximum(np.abs(aggregate[medium]).max(), 1)
+        print('Largest %s difference to the aggregate model: %.2e of the largest tier' %
+              (medium, np.abs(results[medium] - aggregate[medium]).max() / scale))
@@ -0,0 +1,130 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./derivatives.py config1.json,config2.json,...,configN.json
+
+Derivatives of the yearly totals of projection.py (CPU, disk and tape required and capacity) with respect to every
+numeric parameter of the model, from a single evaluation.
+
+This uses the complex step: a parameter p is replaced by p + ih, with h tiny, and the derivative of a result f is
+Im(f) / h, exact to rounding as nothing is subtracted. Every parameter gets its own entry along a batch axis (p + ih
+in its own entry, p everywhere else), so the whole Jacobian comes out of one vectorized pass through the event,
+performance, CPU, storage and capacity computations.
+
+Only the sections in PARAMETER_SECTIONS are differentiated. Years, lifetimes and the lists of shutdown and detector
+years are structure rather than values and are left alone.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import copy
+import csv
+import numbers
+import sys
+
+import numpy as np
+
+from configure import configure, get_parameter, model_years, parameter_name, set_parameter
+from labeled import LabeledArray
+from projection import METRICS, evaluate
+
+PARAMETER_SECTIONS = ['trigger_rate', 'live_fraction', 'mc_event_factor', 'mc_evolution', 'tier_sizes', 'cpu_time',
+                      'improvement_factors', 'storage_model', 'capacity_model', 'static_disk', 'static_tape',
+                      'activity_model']
+STRUCTURAL_SUFFIXES = ('_year', '_lifetime')
+
+COMPLEX_STEP = 1e-30
+
+
+def numeric_parameters(model, sections=None):
+    """
+    Find the numbers that can be differentiated with respect to
+
+    :param model: The configuration dictionary
+    :param sections: top level keys to look in, defaults to PARAMETER_SECTIONS
+    :return: list of paths, each a tuple of the keys (and list indices) leading to a number
+    """
+
+    def walk(value, path):
+        if isinstance(value, dict):
+            for key in sorted(value.keys()):
+                if not str(key).endswith(STRUCTURAL_SUFFIXES):
+                    for found in walk(value[key], path + (key,)):
+                        yield found
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                for found in walk(item, path + (index,)):
+                    yield found
+        elif isinstance(value, numbers.Number) and not isinstance(value, bool):
+            yield path
+
+    paths = []
+    for section in sections or PARAMETER_SECTIONS:
+        if section in model:
+            paths.extend(walk(model[section], (section,)))
+    return paths
+
+
+def jacobian(model, paths=None, years=None, function=evaluate):
+    """
+    :param model: The configuration dictionary
+    :param paths: parameters to differentiate with respect to, defaults to numeric_parameters(model)
+    :param years: Years to consider, defaults to start_year through end_year
+    :param function: what to differentiate, called as function(model, years) and returning a two dimensional
+                     LabeledArray such as the one of projection.evaluate
+    :return: LabeledArray of the results by year and metric, and LabeledArray of their derivatives by parameter,
+             year and metric
+    """
+
+    if paths is None:
+        paths = numeric_parameters(model)
+    years = years or model_years(model)
+    nParameters = len(paths)
+
+    perturbed = copy.deepcopy(model)
+    for index, path in enumerate(paths):
+        step = np.zeros(nParameters, dtype=np.complex128)
+        step[index] = 1j * COMPLEX_STEP
+        set_parameter(perturbed, path, get_parameter(model, path) + step)
+
+    results = function(perturbed, years)
+    values = np.broadcast_to(results.values, (nParameters,) + results.values.shape[-2:])
+    axes = results.axes
+    return (LabeledArray(axes, values[0].real),
+            LabeledArray([('parameter', [parameter_name(path) for path in paths])] + axes,
+                         values.imag / COMPLEX_STEP))
+
+
+if __name__ == '__main__':
+    modelNames = None
+    if len(sys.argv) > 1:
+        modelNames = sys.argv[1].split(',')
+    model = configure(modelNames)
+
+    YEARS = model_years(model)
+    PATHS = numeric_parameters(model)
+    results, derivatives = jacobian(model, PATHS, YEARS)
+    parameterValues = np.array([get_parameter(model, path) for path in PATHS], dtype=np.float64)
+
+    # Elasticities: relative change of the result for a relative change of the parameter
+    with np.errstate(divide='ignore', invalid='ignore'):
+        elasticities = derivatives.values * parameterValues[:, np.newaxis, np.newaxis] / results.values
+    elasticities = np.where(np.isfinite(elasticities), elasticities, 0)
+
+    lastYear = YEARS[-1]
+    for metric in ['cpu_required', 'disk_required', 'tape_required', 'cpu_capacity']:
+        column = elasticities[:, YEARS.index(lastYear), METRICS.index(metric)]
+        print('\nLargest elasticities of %s in %d' % (metric, lastYear))
+        for index in np.argsort(-np.abs(column))[:10]:
+            print('{:+.4f} {}'.format(column[index], parameter_name(PATHS[index])))
+
+    with open('Jacobian.csv', 'w') as jacobianFile:
+        writer = csv.writer(jacobianFile)
+        writer.writerow(['parameter', 'value', 'year', 'metric', 'result', 'derivative', 'elasticity'])
+        for index, path in enumerate(PATHS):
+            for yearIndex, year in enumerate(YEARS):
+                for metricIndex, metric in enumerate(METRICS):
+                    writer.writerow([parameter_name(path), parameterValues[index], year, metric,
+                                     results.values[yearIndex, metricIndex],
+                                     derivatives.values[index, yearIndex, metricIndex],
+                                     elasticities[index, yearIndex, metricIndex]])
@@ -0,0 +1,208 @@
+#! /usr/bin/env python
+
+"""
+Compile named formulas (Python expression syntax, kept in the JSON configuration) into an evaluation plan over
+numpy arrays
+
+Every expression is parsed once with ast and turned into nodes of a single graph shared by all formulas. Identical
+subexpressions get the same node (common subexpression elimination) and operations on numbers only are folded, so
+evaluating the plan is one numpy operation per distinct node whatever the number of years or batch entries. Named
+constants are bound when the plan is evaluated, so one plan serves every value of the parameters.
+Operations are never reordered, so the results are bit for bit those of writing the same expressions in Python.
+
+Allowed in expressions:
+ names of inputs, constants and other formulas
+ numbers, + - * / ** and unary -, comparisons (< <= > >= == !=), & | ~ on booleans
+ maximum(a, b), minimum(a, b), where(condition, a, b)
+ previous(x): x of the year before (the first year gets its own value)
+ chain(x, factors): factors is the name of a constant {year: factor}; in those years, from the second year
+                    modeled on, the result is factor * the result of the year before, elsewhere x
+ chained(factors): True in the years chain replaces x
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import ast
+import json
+import operator
+
+import numpy as np
+
+BINARY_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+                    ast.Pow: operator.pow, ast.BitAnd: operator.and_, ast.BitOr: operator.or_}
+UNARY_OPERATORS = {ast.USub: operator.neg, ast.UAdd: operator.pos, ast.Invert: operator.invert}
+COMPARISONS = {ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+               ast.Eq: operator.eq, ast.NotEq: operator.ne}
+
+
+def previous(values):
+    return np.concatenate([values[..., :1], values[..., :-1]], axis=-1)
+
+
+def chain_positions(years, factors):
+    """
+    :return: list of (index in years, factor) where chain applies
+    """
+
+    return [(years.index(int(year)), factor) for year, factor in sorted(factors.items())
+            if int(year) in years and int(year) - 1 in years]
+
+
+def chain(values, years, factors):
+    result = np.array(values, dtype=np.result_type(values, *factors.values()))
+    for index, factor in chain_positions(years, factors):
+        result[..., index] = factor * result[..., index - 1]
+    return result
+
+
+def chained(years, factors):
+    mask = np.zeros(len(years), dtype=bool)
+    for index, factor in chain_positions(years, factors):
+        mask[index] = True
+    return mask
+
+
+FUNCTIONS = {'maximum': np.maximum, 'minimum': np.minimum, 'where': np.where, 'previous': previous}
+YEAR_FUNCTIONS = {'chain': chain, 'chained': chained}  # The last argument is the name of a {year: value} constant
+
+NUMBERS = tuple(getattr(ast, name) for name in ['Num', 'Constant'] if hasattr(ast, name))
+
+
+class Plan(object):
+    """
+    A compiled set of formulas
+
+    :param formulas: dictionary of name: expression
+    :param inputs: names of the arrays given to evaluate
+    :param constants: dictionary of name: number, or {year: number} for chain and chained. Only the names (and which
+                      are {year: number}) are compiled in, the values are the default of evaluate.
+    """
+
+    def __init__(self, formulas, inputs, constants=None):
+        self.inputs = list(inputs)
+        self.constants = dict(constants or {})
+        self.steps = []  # (kind, function, argument nodes, value, input, constant or year table name) in order
+        self._nodes = {}  # structural key: node
+        self._named = {}  # formula or input name: node
+        self._compiling = set()
+
+        for name in self.inputs:
+            self._named[name] = self._node(('input', name), ('input', None, (), None, name))
+        for name in sorted(formulas):
+            self._formula(name, formulas)
+
+    def _node(self, key, step):
+        if key not in self._nodes:
+            self._nodes[key] = len(self.steps)
+            self.steps.append(step)
+        return self._nodes[key]
+
+    def _constant(self, value):
+        return self._node(('constant', type(value).__name__, repr(value)), ('constant', None, (), value, None))
+
+    def _apply(self, function, arguments):
+        """
+        Node for function applied to argument nodes, folded if they are all numbers
+        """
+
+        if all(self.steps[argument][0] == 'constant' for argument in arguments):
+            return self._constant(function(*[self.steps[argument][3] for argument in arguments]))
+        return self._node((function,) + tuple(arguments), ('apply', function, tuple(arguments), None, None))
+
+    def _formula(self, name, formulas):
+        if name in self._named:
+            return self._named[name]
+        if name in self._compiling:
+            raise ValueError('Formula %r depends on itself' % name)
+        self._compiling.add(name)
+        try:
+            tree = ast.parse(formulas[name].strip(), mode='eval')
+        except SyntaxError as error:
+            raise ValueError('Cannot parse formula %r: %s' % (name, error))
+        self._named[name] = self._expression(tree.body, formulas, name)
+        self._compiling.discard(name)
+        return self._named[name]
+
+    def _expression(self, tree, formulas, name):
+        """
+        Node for one ast node of the formula name
+        """
+
+        if isinstance(tree, ast.Name):
+            if tree.id in self._named or tree.id in formulas:
+                return self._formula(tree.id, formulas)
+            if tree.id in self.constants and not isinstance(self.constants[tree.id], dict):
+                return self._node(('named', tree.id), ('named', None, (), None, tree.id))
+            raise ValueError('Unknown name %r in formula %r' % (tree.id, name))
+        if isinstance(tree, NUMBERS):
+            return self._constant(getattr(tree, 'n', getattr(tree, 'value', None)))
+        if isinstance(tree, ast.BinOp) and type(tree.op) in BINARY_OPERATORS:
+            return self._apply(BINARY_OPERATORS[type(tree.op)], [self._expression(tree.left, formulas, name),
+                                                                 self._expression(tree.right, formulas, name)])
+        if isinstance(tree, ast.UnaryOp) and type(tree.op) in UNARY_OPERATORS:
+            return self._apply(UNARY_OPERATORS[type(tree.op)], [self._expression(tree.operand, formulas, name)])
+        if isinstance(tree, ast.Compare) and len(tree.ops) == 1 and type(tree.ops[0]) in COMPARISONS:
+            return self._apply(COMPARISONS[type(tree.ops[0])], [self._expression(tree.left, formulas, name),
+                                                                self._expression(tree.comparators[0], formulas, name)])
+        if isinstance(tree, ast.Call) and isinstance(tree.func, ast.Name) and not tree.keywords:
+            function = tree.func.id
+            if function in FUNCTIONS:
+                return self._apply(FUNCTIONS[function], [self._expression(argument, formulas, name)
+                                                         for argument in tree.args])
+            if function in YEAR_FUNCTIONS:
+                table = tree.args[-1]
+                if not isinstance(table, ast.Name) or not isinstance(self.constants.get(table.id), dict):
+                    raise ValueError('The last argument of %s in formula %r must name a {year: value} constant' %
+                                     (function, name))
+                arguments = tuple(self._expression(argument, formulas, name) for argument in tree.args[:-1])
+                return self._node((function, table.id) + arguments,
+                                  ('year', YEAR_FUNCTIONS[function], arguments, None, table.id))
+        raise ValueError('Unsupported expression %r in formula %r' % (ast.dump(tree), name))
+
+    @property
+    def names(self):
+        return [name for name in self._named if name not in self.inputs]
+
+    def evaluate(self, inputs, years, names=None, constants=None):
+        """
+        :param inputs: dictionary of input name: array (year last)
+        :param years: the years along the last axis, for chain and chained
+        :param names: formulas to return, defaults to all of them
+        :param constants: dictionary of the constants, numbers or arrays (batches), defaults to those compiled with
+        :return: dictionary of name: array
+        """
+
+        constants = self.constants if constants is None else constants
+        values = [None] * len(self.steps)
+        for node, (kind, function, arguments, value, label) in enumerate(self.steps):
+            if kind == 'input':
+                values[node] = inputs[label]
+            elif kind == 'constant':
+                values[node] = value
+            elif kind == 'named':
+                values[node] = constants[label]
+            elif kind == 'year':
+                values[node] = function(*([values[argument] for argument in arguments] +
+                                          [years, constants[label]]))
+            else:
+                values[node] = function(*[values[argument] for argument in arguments])
+        return dict((name, values[self._named[name]]) for name in names or self.names)
+
+
+_PLANS = {}
+
+
+def compiled(formulas, inputs, constants=None):
+    """
+    Compile formulas, or reuse the plan compiled earlier for the same formulas, inputs and names of constants. The
+    values of the constants are not part of the plan, pass them to evaluate.
+
+    :return: Plan
+    """
+
+    key = json.dumps([formulas, sorted(inputs),
+                      sorted((name, isinstance(value, dict)) for name, value in (constants or {}).items())],
+                     sort_keys=True)
+    if key not in _PLANS:
+        _PLANS[key] = Plan(formulas, inputs, constants)
+    return _PLANS[key]
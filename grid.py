@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./grid.py config1.json,config2.json,...,configN.json
+
+What-if grid: evaluate the model for every combination of the values along the axes in the grid section of the
+configuration (see TriggerSoftwareGrid.json) and plot the capacity shortfall of one resource in one year as a
+heatmap.
+
+ grid.axes: list of {"parameter": "trigger_rate/2026", "values": [...]} or {"parameter": ..., "start": x,
+            "stop": y, "num": n}. Parameters are '/' separated keys into the model, list entries by index. Years and
+            lifetimes (keys ending in _year or _lifetime) are structure and cannot be grid axes.
+ grid.resource: 'cpu', 'disk' or 'tape'
+ grid.year: the year the shortfall is shown for
+
+The grid is not looped over: the values of axis i are given to the model as an array along dimension i, and the
+whole Cartesian product goes through projection.py in one pass as batch dimensions.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import copy
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from configure import configure, get_parameter, model_years, parameter_path, set_parameter
+from derivatives import STRUCTURAL_SUFFIXES
+from plotting import plotHeatmap
+from projection import evaluate
+
+SCALES = {'cpu': (1e3, 'kHS06'), 'disk': (1e15, 'PB'), 'tape': (1e15, 'PB')}
+
+
+def axis_values(axis):
+    """
+    :param axis: one entry of grid.axes
+    :return: numpy array of the values along the axis
+    """
+
+    if 'values' in axis:
+        return np.array(axis['values'], dtype=np.float64)
+    return np.linspace(axis['start'], axis['stop'], axis['num'])
+
+
+def evaluate_grid(model, years=None):
+    """
+    :param model: The configuration dictionary with a grid section
+    :param years: Years to consider, defaults to start_year through end_year
+    :return: list of value arrays, one per grid axis, and LabeledArray by year and metric with one batch dimension
+             per grid axis
+    """
+
+    axes = model['grid']['axes']
+    gridModel = copy.deepcopy(model)
+    values = []
+    for dimension, axis in enumerate(axes):
+        path = parameter_path(model, axis['parameter'])
+        if not np.isscalar(get_parameter(model, path)):
+            raise ValueError('Grid parameter %r is not a single number' % axis['parameter'])
+        if any(str(key).endswith(STRUCTURAL_SUFFIXES) for key in path):
+            raise ValueError('Grid parameter %r is a year or lifetime, which cannot vary along a grid' %
+                             axis['parameter'])
+        values.append(axis_values(axis))
+        shape = [1] * len(axes)
+        shape[dimension] = len(values[-1])
+        set_parameter(gridModel, path, values[-1].reshape(shape))
+
+    results = evaluate(gridModel, years)
+    results.values = np.ascontiguousarray(np.broadcast_to(results.values, tuple(len(value) for value in values) +
+                                                          results.values.shape[-2:]))
+    return values, results
+
+
+if __name__ == '__main__':
+    modelNames = None
+    if len(sys.argv) > 1:
+        modelNames = sys.argv[1].split(',')
+    model = configure(modelNames)
+    if 'grid' not in model:
+        sys.exit('No grid section in the configuration, see TriggerSoftwareGrid.json')
+
+    YEARS = model_years(model)
+    grid = model['grid']
+    resource = grid['resource']
+    scale, unit = SCALES[resource]
+
+    start = time.time()
+    values, results = evaluate_grid(model, YEARS)
+    elapsed = time.time() - start
+
+    selected = results.select(year=grid['year'])
+    shortfall = (selected.select(metric=resource + '_required').values -
+                 selected.select(metric=resource + '_capacity').values) / scale
+
+    names = [axis['parameter'] for axis in grid['axes']]
+    print('Evaluated %s grid over %s in %.2f s' % ('x'.join(str(len(value)) for value in values),
+                                                    ', '.join(names), elapsed))
+    print('%s shortfall in %d: %.1f to %.1f %s, short in %.1f%% of the grid' %
+          (resource.upper(), grid['year'], shortfall.min(), shortfall.max(), unit, 100 * (shortfall > 0).mean()))
+
+    if len(values) == 2:
+        frame = pd.DataFrame(shortfall, index=values[0], columns=values[1])
+        frame.index.name = names[0]
+        frame.columns.name = names[1]
+        frame.to_csv('Grid.csv')
+        plotHeatmap(shortfall, name='Grid.png', xvalues=values[1], yvalues=values[0], xlabel=names[1],
+                    ylabel=names[0], label='%s shortfall (%s)' % (resource.upper(), unit),
+                    title='%s required - capacity in %d' % (resource.upper(), grid['year']))
+    else:
+        for index in np.ndindex(*shortfall.shape):
+            print(' '.join('{:g}'.format(values[axis][position]) for axis, position in enumerate(index)),
+                  '{:.1f}'.format(shortfall[index]))
@@ -0,0 +1,209 @@
+#! /usr/bin/env python
+
+
+"""
+A small labeled array: named axes with labels along each of them, backed by a single contiguous float64 buffer
+
+Used in place of nested dictionaries for the year/producedYear/dataType/tier tables so that selections and
+sums along an axis are array operations. Conversion to pandas is deferred until something needs to be plotted.
+
+The buffer may have extra leading (batch) dimensions in front of the labeled axes, e.g. one per set of parameters
+when many variations of a model are evaluated at once, and may be complex (derivatives.py). Selections and sums
+carry the batch dimensions along.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+
+class LabeledArray(object):
+    """
+    An n-dimensional float64 array where each axis has a name and a list of labels
+
+    :param axes: list of (name, labels) pairs, one per axis
+    :param values: optional initial values, the trailing dimensions must match the shape given by the labels
+    """
+
+    def __init__(self, axes, values=None):
+        self.names = [name for name, _labels in axes]
+        self.labels = [list(labels) for _name, labels in axes]
+        self._positions = [dict((label, i) for i, label in enumerate(labels)) for labels in self.labels]
+        shape = tuple(len(labels) for labels in self.labels)
+
+        if values is None:
+            self.values = np.zeros(shape, dtype=np.float64)
+        else:
+            self.values = np.ascontiguousarray(values, dtype=np.result_type(values, np.float64))
+            if self.values.shape[self.values.ndim - len(shape):] != shape:
+                raise ValueError('Values of shape %s do not match axes of shape %s' % (self.values.shape, shape))
+
+    @property
+    def axes(self):
+        return list(zip(self.names, self.labels))
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def batch_shape(self):
+        """
+        The shape of the leading dimensions that have no labels
+        """
+
+        return self.values.shape[:self.values.ndim - len(self.names)]
+
+    def axis(self, name):
+        """
+        :param name: axis name
+        :return: the position of the axis
+        """
+
+        try:
+            return self.names.index(name)
+        except ValueError:
+            raise KeyError('No axis named %r, axes are %s' % (name, self.names))
+
+    def position(self, name, label):
+        """
+        :param name: axis name
+        :param label: label along that axis
+        :return: the index of label along the axis
+        """
+
+        try:
+            return self._positions[self.axis(name)][label]
+        except KeyError:
+            raise KeyError('No label %r on axis %r' % (label, name))
+
+    def _index(self, coords):
+        """
+        Turn a {axis name: label or list of labels} dictionary into a numpy index tuple
+        """
+
+        index = [slice(None)] * len(self.names)
+        for name, label in coords.items():
+            if isinstance(label, (list, tuple)):
+                index[self.axis(name)] = [self.position(name, item) for item in label]
+            else:
+                index[self.axis(name)] = self.position(name, label)
+        return (Ellipsis,) + tuple(index)
+
+    def _promote(self, value, coords):
+        """
+        Widen the buffer to the batch shape and type of a value about to be stored in it
+
+        :param value: number or array, any dimensions in front of those of the selection are batch dimensions
+        :param coords: the selection value is for
+        """
+
+        value = np.asarray(value)
+        cellDims = np.ndim(self.values[self._index(coords)]) - len(self.batch_shape)
+        valueBatch = value.shape[:max(value.ndim - cellDims, 0)]
+        batchShape = np.broadcast(np.empty(self.batch_shape), np.empty(valueBatch)).shape
+        dtype = np.result_type(self.values, value)
+        if batchShape != self.batch_shape or dtype != self.values.dtype:
+            labeledShape = self.values.shape[len(self.batch_shape):]
+            self.values = np.ascontiguousarray(np.broadcast_to(self.values, batchShape + labeledShape), dtype=dtype)
+
+    def add(self, value, **coords):
+        """
+        Accumulate value into the cell (or the broadcast selection) given by coords
+
+        :param value: number or array to add, with any batch dimensions in front
+        :param coords: axis name = label for the axes to address
+        """
+
+        self._promote(value, coords)
+        self.values[self._index(coords)] += value
+
+    def get(self, **coords):
+        """
+        :param coords: axis name = label for every axis
+        :return: the value of a single cell, an array over the batch dimensions if there are any
+        """
+
+        if self.batch_shape:
+            return self.values[self._index(coords)]
+        return float(self.values[self._index(coords)])
+
+    def select(self, **coords):
+        """
+        Select along one or more axes without summing.
+
+        A single label drops the axis, a list of labels keeps it with only those labels.
+
+        :param coords: axis name = label or list of labels
+        :return: a new LabeledArray (a view onto the same buffer where numpy allows it)
+        """
+
+        index = []
+        axes = []
+        for name, labels in self.axes:
+            if name not in coords:
+                index.append(slice(None))
+                axes.append((name, labels))
+            elif isinstance(coords[name], (list, tuple)):
+                index.append([self.position(name, label) for label in coords[name]])
+                axes.append((name, coords[name]))
+            else:
+                index.append(self.position(name, coords[name]))
+
+        # Fancy indexing on more than one axis at a time does not do an outer product, so index one axis at a time.
+        # Going from the last axis, everything after the one indexed is already in its final shape.
+        values = self.values
+        for position in reversed(range(len(index))):
+            after = len([item for item in index[position + 1:] if not isinstance(item, int)])
+            full = [Ellipsis, index[position]] + [slice(None)] * after
+            values = values[tuple(full)]
+        return LabeledArray(axes, values)
+
+    def sum(self, *names):
+        """
+        Sum over the named axes
+
+        :param names: axes to sum over
+        :return: a new LabeledArray without those axes, or a float (array over the batch dimensions) if no axes
+                 remain
+        """
+
+        positions = tuple(self.axis(name) - len(self.names) for name in names)
+        values = self.values.sum(axis=positions)
+        axes = [(name, labels) for name, labels in self.axes if name not in names]
+        if not axes:
+            return values if self.batch_shape else float(values)
+        return LabeledArray(axes, values)
+
+    def to_frame(self, scale=1.0):
+        """
+        Make a pandas DataFrame out of a two dimensional array. The first axis becomes the index and the second the
+        columns. The buffer is shared with the frame unless a scale is applied.
+
+        :param scale: divide the values by this (e.g. PETA)
+        :return: pandas DataFrame
+        """
+
+        import pandas as pd
+
+        if len(self.names) != 2 or self.batch_shape:
+            raise ValueError('Only two dimensional arrays can be turned into a frame, axes are %s' % self.names)
+        values = self.values if scale == 1.0 else self.values / scale
+        frame = pd.DataFrame(values, index=self.labels[0], columns=self.labels[1], copy=False)
+        frame.index.name = self.names[0]
+        frame.columns.name = self.names[1]
+        return frame
+
+
+def stack_trailing(arrays, axis=-1):
+    """
+    Stack numbers or arrays that may have batch dimensions into a new axis counted from the end, e.g. values by year
+    into an array (batch..., year). The inputs are broadcast together first.
+
+    :param arrays: list of numbers or arrays
+    :param axis: where the new axis goes, a negative position
+    :return: numpy array
+    """
+
+    arrays = np.broadcast_arrays(*[np.asarray(array) for array in arrays])
+    return np.stack(arrays, axis=axis)
@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./network.py config1.json,config2.json,...,configN.json
+
+WAN transfers needed to place the disk and tape replicas of storage_model.
+
+For each produced year and tier, every copy kept on a medium has to be transferred, except for one copy of what the
+site model (sites.py) places at the roles that produce the data (producing_roles by data type, e.g. T0 for data),
+as does every increase in the number of copies as the data ages (a new version or more replicas). On top of that,
+refresh_fraction of what is kept is moved again each year (replicas recreated after deletions, popularity based
+placement).
+
+The bytes are split among the destination site roles with the same rules as the site model (sites.py). The topology
+is given by the number of WAN hops to reach each role (e.g. 2 for T2s behind their T1 in a hierarchical model, 1
+everywhere for a full mesh). The required bandwidth is the bytes times hops, over a year, divided by the link
+efficiency, times peak_factor.
+"""
+
+from __future__ import division, print_function
+
+import sys
+
+import numpy as np
+
+from activities import SECONDS_PER_YEAR
+from configure import configure, model_years
+from labeled import LabeledArray
+from plotting import plotStorage
+from sites import ROLES, allocation_weights, site_names
+from storage import data_on_media_by_cohort, data_produced
+
+PETA = 1e15
+GIGABIT = 1e9 / 8
+
+
+def role_weights(model, medium, tiers):
+    """
+    :return: numpy array (tier, role) of the fraction of each tier the site model places at each role
+    """
+
+    sites = model['site_model']['sites']
+    roles = np.array([ROLES.index(sites[site]['role']) for site in site_names(model)])
+    siteToRole = (roles[:, np.newaxis] == np.arange(len(ROLES))[np.newaxis, :]).astype(np.float64)
+    return allocation_weights(model, medium, tiers).dot(siteToRole)
+
+
+def transfers(model, produced, medium):
+    """
+    :param model: The configuration dictionary
+    :param produced: LabeledArray from data_produced
+    :param medium: 'disk' or 'tape'
+    :return: LabeledArray by year and tier of bytes transferred over the WAN
+    """
+
+    networkModel = model['network_model']
+    kept = data_on_media_by_cohort(model, produced, medium)  # (year, producedYear, dataType, tier)
+    years = kept.labels[kept.axis('year')]
+
+    # New copies: increase of what is kept of each produced year since the year before
+    previous = np.concatenate([np.zeros((1,) + kept.shape[1:]), kept.values[:-1]])
+    created = np.maximum(kept.values - previous, 0).sum(axis=(1, 2))
+
+    # What the site model places where the data is produced does not travel, at most one copy of it
+    tiers = kept.labels[kept.axis('tier')]
+    weights = role_weights(model, medium, tiers)
+    producingRoles = networkModel['producing_roles']
+    localShare = np.array([weights[:, [ROLES.index(role) for role in producingRoles[dataType]]].sum(axis=1)
+                           for dataType in kept.labels[kept.axis('dataType')]])  # (dataType, tier)
+    firstYear = np.arange(len(years))
+    keptNew = kept.values[firstYear, firstYear]  # (producedYear, dataType, tier)
+    local = np.minimum(localShare * keptNew, produced.values).sum(axis=1)
+
+    refreshed = networkModel['refresh_fraction'][medium] * kept.values.sum(axis=(1, 2))
+
+    return LabeledArray([('year', years), ('tier', tiers)], created - local + refreshed)
+
+
+def transfers_by_role(model, bytesByTier, medium):
+    """
+    :param model: The configuration dictionary
+    :param bytesByTier: LabeledArray of bytes by year and tier
+    :param medium: 'disk' or 'tape'
+    :return: LabeledArray of bytes by year and destination role
+    """
+
+    weights = role_weights(model, medium, bytesByTier.labels[bytesByTier.axis('tier')])  # (tier, role)
+    years = bytesByTier.labels[bytesByTier.axis('year')]
+    return LabeledArray([('year', years), ('role', ROLES)], bytesByTier.values.dot(weights))
+
+
+def bandwidth(model, bytesByRole):
+    """
+    :param model: The configuration dictionary
+    :param bytesByRole: LabeledArray of bytes by year and destination role
+    :return: numpy array by year of the aggregate WAN bandwidth needed (bytes/s)
+    """
+
+    networkModel = model['network_model']
+    hops = np.array([networkModel['hops_by_role'][role] for role in bytesByRole.labels[-1]])
+    return (bytesByRole.values.dot(hops) / SECONDS_PER_YEAR / networkModel['efficiency'] *
+            networkModel['peak_factor'])
+
+
+if __name__ == '__main__':
+    modelNames = None
+    if len(sys.argv) > 1:
+        modelNames = sys.argv[1].split(',')
+    model = configure(modelNames)
+
+    YEARS = model_years(model)
+    dataProduced = data_produced(model, YEARS)
+    TIERS = dataProduced.labels[dataProduced.axis('tier')]
+
+    byTier = {medium: transfers(model, dataProduced, medium) for medium in ['disk', 'tape']}
+    byRole = {medium: transfers_by_role(model, byTier[medium], medium) for medium in ['disk', 'tape']}
+    rates = {medium: bandwidth(model, byRole[medium]) for medium in ['disk', 'tape']}
+
+    print('WAN transfers by tier in PB (disk + tape replicas)')
+    print('year;' + ';'.join(TIERS) + ';total')
+    total = byTier['disk'].values + byTier['tape'].values
+    for index, year in enumerate(YEARS):
+        print(year, ' '.join('{:8.2f}'.format(value / PETA) for value in total[index]),
+              '{:8.2f}'.format(total[index].sum() / PETA))
+
+    print('\nWAN bandwidth in Gb/s')
+    print('Year ' + ' '.join('SustainedTo' + role for role in ROLES) + ' PeakDisk PeakTape PeakTotal')
+    for index, year in enumerate(YEARS):
+        toRole = (byRole['disk'].values[index] + byRole['tape'].values[index]) / SECONDS_PER_YEAR
+        print(year, ' '.join('{:.1f}'.format(value / GIGABIT) for value in toRole),
+              '{:.1f}'.format(rates['disk'][index] / GIGABIT), '{:.1f}'.format(rates['tape'][index] / GIGABIT),
+              '{:.1f}'.format((rates['disk'][index] + rates['tape'][index]) / GIGABIT))
+
+    plotStorage(total / PETA, name='WAN Transfers by Tier.png', title='WAN transfers by tier', columns=TIERS,
+                index=YEARS)
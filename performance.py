@@ -10,18 +10,13 @@ from __future__ import absolute_import, division, print_function
 from utils import interpolate_value
 
 
-def performance_by_year(model, year, tier, data_type=None, kind=None):
+def performance_kind(year, kind=None, hlStartYear=None):
     """
-    Return various performance metrics based on the year under consideration
-    (allows for step and continuous variations)
-
-    :param model: The model parameters
     :param year: The year in which processing is done
-    :param tier: Data tier produced
-    :param data_type: data or mc
-    :param kind: The year flavor of MC or data. May differ from actual running year
-
-    :return:  tuple of cpu time (HS06 * s) and data size
+    :param kind: The year flavor of MC or data, defaults to the year itself
+    :param hlStartYear: first year of HL-LHC running (hl_start_year), defaults to 2026. Years from the one before
+                        have the '2026' flavor.
+    :return: the flavor the tier sizes, CPU times and software improvements are looked up for
     """
 
     # If we don't specify flavors, assume we are talking about the current year
@@ -31,11 +26,28 @@ def performance_by_year(model, year, tier, data_type=None, kind=None):
         # print year
         kind = str(year)
     if kind not in ['2016', '2026']:
-        if int(kind) >= 2025:
+        if int(kind) >= (hlStartYear or 2026) - 1:
             kind = '2026'
         else:
             kind = '2017'
-    kind = str(kind)
+    return str(kind)
+
+
+def performance_by_year(model, year, tier, data_type=None, kind=None):
+    """
+    Return various performance metrics based on the year under consideration
+    (allows for step and continuous variations)
+
+    :param model: The model parameters
+    :param year: The year in which processing is done
+    :param tier: Data tier produced
+    :param data_type: data or mc
+    :param kind: The year flavor of MC or data. May differ from actual running year
+
+    :return:  tuple of cpu time (HS06 * s) and data size
+    """
+
+    kind = performance_kind(year, kind, model.get('hl_start_year'))
 
     try:
         for modelYear in sorted(model['tier_sizes'][tier].keys()):
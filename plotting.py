@@ -7,6 +7,7 @@ Common plotting code
 
 from __future__ import absolute_import, division, print_function
 
+import matplotlib.pyplot as plt
 import pandas as pd
 
 # Make sort order that includes tiers from unrefined to refined and both string and integer years
@@ -56,3 +57,28 @@ def plotEvents(data, name, title='', columns=None, index=None):
         tick.set_rotation(45)
     fig = ax.get_figure()
     fig.savefig(name)
+
+
+def plotBandwidth(data, name, title='', columns=None, index=None, limit='Limit'):
+    # Stacked bars of the rates with the limit as a line on top
+    frame = pd.DataFrame(data, columns=columns, index=[str(year) for year in index])
+    bars = [column for column in columns if column != limit]
+    ax = frame[bars].plot(kind='bar', stacked=True, colormap=COLOR_MAP)
+    ax.plot(range(len(frame)), frame[limit].values, linestyle='-', marker='o', color='Black', label=limit)
+    ax.set(ylabel='GB/s', title=title)
+
+    ax.legend(loc='best', markerscale=0.25, fontsize=11)
+    for tick in ax.get_xticklabels():
+        tick.set_rotation(45)
+    fig = ax.get_figure()
+    fig.savefig(name)
+
+
+def plotHeatmap(data, name, title='', xvalues=None, yvalues=None, xlabel='', ylabel='', label=''):
+    # Signed values on a diverging color scale centered on 0, rows along y
+    limit = max(abs(data.min()), abs(data.max())) or 1
+    fig, ax = plt.subplots()
+    mesh = ax.pcolormesh(xvalues, yvalues, data, cmap='RdBu_r', vmin=-limit, vmax=limit)
+    fig.colorbar(mesh, ax=ax, label=label)
+    ax.set(xlabel=xlabel, ylabel=ylabel, title=title)
+    fig.savefig(name)
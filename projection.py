@@ -0,0 +1,82 @@
+#! /usr/bin/env python
+
+"""
+Summary of one model: the totals of cpu.py and data.py that scenarios are compared on, by year
+
+ cpu_required, disk_required, tape_required: HS06 and bytes, all activities and tiers (including static data)
+ cpu_capacity, disk_capacity, tape_capacity: from capacity_model
+
+Most of the time goes into the per year inputs (compile_inputs), which are built year by year in Python. The rest
+(activity formulas, storage convolutions, capacity) works on whole arrays by year.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+from activities import cpu_requirements, cpu_series
+from capacity import capacity_model
+from configure import model_years
+from labeled import LabeledArray, stack_trailing
+from storage import data_on_media, data_produced, static_data
+
+METRICS = ['cpu_required', 'cpu_capacity', 'disk_required', 'disk_capacity', 'tape_required', 'tape_capacity']
+
+
+def compile_inputs(model, years=None, prefix=None, divergence=None):
+    """
+    The per year inputs of evaluate: the series of cpu_series and the data produced
+
+    :param model: The configuration dictionary
+    :param years: Years to consider, defaults to start_year through end_year
+    :param prefix: inputs compiled for another model, whose years before divergence are reused instead of computed
+    :param divergence: first year in which the inputs of the two models may differ (see sweep.py)
+    :return: dictionary with the years, the series ('series') and LabeledArray of data produced ('produced')
+    """
+
+    years = years or model_years(model)
+    tiers = list(model['tier_sizes'].keys())
+
+    shared = 0
+    if prefix is not None and prefix['produced'].labels[prefix['produced'].axis('tier')] == tiers:
+        for year, prefixYear in zip(years, prefix['years']):
+            if year != prefixYear or year >= divergence:
+                break
+            shared += 1
+    if not shared:
+        return {'years': years, 'series': cpu_series(model, years), 'produced': data_produced(model, years)}
+
+    produced = prefix['produced']
+    series = dict((name, values[..., :shared]) for name, values in prefix['series'].items())
+    producedValues = produced.values[..., :shared, :, :]
+    if shared < len(years):
+        later = cpu_series(model, years[shared:])
+        series = dict((name, np.concatenate([series[name], later[name]], axis=-1)) for name in later)
+        producedValues = np.concatenate([producedValues, data_produced(model, years[shared:]).values], axis=-3)
+
+    axes = [('producedYear', years)] + produced.axes[1:]
+    return {'years': years, 'series': series, 'produced': LabeledArray(axes, producedValues)}
+
+
+def evaluate(model, years=None, inputs=None):
+    """
+    :param model: The configuration dictionary
+    :param years: Years to consider, defaults to start_year through end_year
+    :param inputs: compile_inputs of the model for these years, if already computed
+    :return: LabeledArray by year and metric, after any batch dimensions of the parameters
+    """
+
+    years = years or model_years(model)
+    inputs = inputs or compile_inputs(model, years)
+    produced = inputs['produced']
+    cpuRequired, cpuTime = cpu_requirements(model, years, inputs['series'])
+
+    columns = {'cpu_required': cpuRequired.sum('activity').values}
+    for medium in ['disk', 'tape']:
+        columns[medium + '_required'] = (data_on_media(model, produced, medium).sum('dataType', 'tier').values +
+                                         static_data(model, medium, years).sum('producedYear', 'tier').values)
+    for resource in ['cpu', 'disk', 'tape']:
+        columns[resource + '_capacity'] = capacity_model(model, resource, years)
+
+    values = stack_trailing([columns[metric] for metric in METRICS])
+    return LabeledArray([('year', years), ('metric', METRICS)], values)
@@ -0,0 +1,107 @@
+#! /usr/bin/env python
+
+"""
+Results of many scenarios in one memory mapped float64 file of shape (scenario, year, metric)
+
+The labels and any metadata are kept in a JSON sidecar (path + '.json'). Worker processes open the store for
+writing and fill in their own scenario in place; the parent reads the same pages back without copying or
+unpickling anything. Years a scenario does not cover stay NaN.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import numpy as np
+
+from labeled import LabeledArray
+
+
+class ResultStore(object):
+    """
+    An existing store, opened read only ('r') or for writing ('r+')
+
+    :param path: the binary file, labels are read from path + '.json'
+    :param mode: numpy.memmap mode
+    """
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        with open(path + '.json', 'r') as sidecar:
+            header = json.load(sidecar)
+        self.scenarios = header['scenarios']
+        self.years = header['years']
+        self.metrics = header['metrics']
+        self.metadata = header.get('metadata', {})
+        self._scenarioIndex = dict((name, i) for i, name in enumerate(self.scenarios))
+        self._yearIndex = dict((year, i) for i, year in enumerate(self.years))
+        self.values = np.memmap(path, dtype=np.float64, mode=mode,
+                                shape=(len(self.scenarios), len(self.years), len(self.metrics)))
+
+    @classmethod
+    def create(cls, path, scenarios, years, metrics, metadata=None):
+        """
+        Write the sidecar and a NaN filled binary file, and open the store for writing
+
+        :param path: the binary file to create
+        :param scenarios: list of scenario names
+        :param years: list of years, the union of what the scenarios cover
+        :param metrics: list of metric names
+        :param metadata: optional JSON serializable dictionary kept with the labels
+        :return: ResultStore
+        """
+
+        if len(set(scenarios)) != len(scenarios):
+            raise ValueError('Scenario names must be unique')
+        with open(path + '.json', 'w') as sidecar:
+            json.dump({'scenarios': list(scenarios), 'years': list(years), 'metrics': list(metrics),
+                       'metadata': metadata or {}}, sidecar, indent=1, sort_keys=True)
+        values = np.memmap(path, dtype=np.float64, mode='w+', shape=(len(scenarios), len(years), len(metrics)))
+        values[...] = np.nan
+        values.flush()
+        del values
+        return cls(path, mode='r+')
+
+    def index(self, scenario):
+        """
+        :param scenario: scenario name
+        :return: position of the scenario in the store
+        """
+
+        try:
+            return self._scenarioIndex[scenario]
+        except KeyError:
+            raise KeyError('No scenario %r in %s' % (scenario, self.path))
+
+    def write(self, scenario, results):
+        """
+        Copy one scenario's results into its slice of the file
+
+        :param scenario: scenario name
+        :param results: LabeledArray by year and metric, years must be in the store
+        """
+
+        rows = [self._yearIndex[year] for year in results.labels[results.axis('year')]]
+        columns = [self.metrics.index(metric) for metric in results.labels[results.axis('metric')]]
+        values = results.values if results.axis('year') == 0 else results.values.T
+        self.values[self.index(scenario), np.array(rows)[:, np.newaxis], np.array(columns)] = values
+
+    def flush(self):
+        self.values.flush()
+
+    def get(self, scenario):
+        """
+        :param scenario: scenario name
+        :return: LabeledArray by year and metric sharing memory with the file
+        """
+
+        return LabeledArray([('year', self.years), ('metric', self.metrics)], self.values[self.index(scenario)])
+
+    def metric(self, metric):
+        """
+        :param metric: metric name
+        :return: LabeledArray by scenario and year (a copy, a metric is strided in the file)
+        """
+
+        return LabeledArray([('scenario', self.scenarios), ('year', self.years)],
+                            self.values[:, :, self.metrics.index(metric)])
@@ -0,0 +1,82 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./scenarios.py scenario1.json scenario2.json,other.json ... [--processes N] [--output scenarios.dat]
+
+Evaluate several scenarios in parallel. Each argument is a comma separated list of configuration files, read on top
+of the defaults as for the other programs, and names the scenario. Every worker evaluates one scenario
+(projection.py) and writes it straight into its slice of a memory mapped ResultStore, so only the scenario name
+travels back to the parent.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import multiprocessing
+
+from configure import configure, model_years
+from projection import METRICS, evaluate
+from resultstore import ResultStore
+
+PETA = 1e15
+KILO = 1e3
+
+
+def evaluate_into(args):
+    """
+    Worker: evaluate one scenario and write it into the store
+
+    :param args: (store path, scenario name)
+    :return: the scenario name
+    """
+
+    path, scenario = args
+    results = evaluate(configure(scenario.split(',')))
+    store = ResultStore(path, mode='r+')
+    store.write(scenario, results)
+    store.flush()
+    return scenario
+
+
+def run_scenarios(scenarios, path, processes=None):
+    """
+    :param scenarios: list of scenarios, each a comma separated list of configuration files
+    :param path: file for the ResultStore
+    :param processes: number of worker processes, defaults to the number of CPUs
+    :return: ResultStore opened read only
+    """
+
+    years = set()
+    for scenario in scenarios:
+        years.update(model_years(configure(scenario.split(','))))
+    ResultStore.create(path, scenarios, list(range(min(years), max(years) + 1)), METRICS,
+                       metadata={'configurations': dict((scenario, scenario.split(',')) for scenario in scenarios)})
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for scenario in pool.imap_unordered(evaluate_into, [(path, scenario) for scenario in scenarios]):
+            print('Finished', scenario)
+    finally:
+        pool.close()
+        pool.join()
+    return ResultStore(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluate scenarios in parallel into a shared result store')
+    parser.add_argument('scenarios', nargs='+', help='comma separated lists of configuration files')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--output', default='scenarios.dat')
+    args = parser.parse_args()
+
+    store = run_scenarios(args.scenarios, args.output, args.processes)
+
+    for resource, scale, unit in [('cpu', KILO, 'kHS06'), ('disk', PETA, 'PB'), ('tape', PETA, 'PB')]:
+        required = store.metric(resource + '_required')
+        capacity = store.metric(resource + '_capacity')
+        print('\n%s required / capacity in %s' % (resource.capitalize(), unit))
+        print('Year ' + ' '.join(store.scenarios))
+        for index, year in enumerate(store.years):
+            print(year, ' '.join('{:.0f}/{:.0f}'.format(required.values[row, index] / scale,
+                                                        capacity.values[row, index] / scale)
+                                 for row in range(len(store.scenarios))))
@@ -0,0 +1,180 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./schedules.py config1.json,config2.json,...,configN.json
+
+Sample LHC schedules (shutdown start and length, live fraction of each year, new detector years) from the
+distributions in the schedule_model section of the configuration (see ScheduleSampling.json) and give the probability
+that the capacity falls short of what is required in each year.
+
+ schedule_model.samples, schedule_model.seed: how many schedules to draw, with which random seed
+ schedule_model.shutdowns: list of {"name": "LS3", "start": ..., "length": ..., "new_detector": true}. start and
+                           length are a number or {"values": [...], "weights": [...]} (weights default to equal).
+                           With new_detector, the first year after the shutdown has new detectors.
+ schedule_model.new_detector_years: new detector years not tied to a shutdown
+ schedule_model.live_fraction: the live fraction of each year is the one of the model times a factor drawn from a
+                               normal distribution ("sigma", relative), times "poor_factor" with probability
+                               "poor_probability" (a year of poor machine availability), kept in ["minimum",
+                               "maximum"]
+
+The shutdown and detector years replace shutdown_years and new_detector_years. The HL-LHC era follows the last
+shutdown with new detectors: hl_start_year becomes the first year after it, and the inputs tied to the start of the
+era (the trigger_rate and live_fraction values from hl_start_year on, activity_model constant hllhc_mc_year, and the
+year the '2026' tier sizes and CPU times take over, see performance.performance_kind) move with it. Software
+improvement and MC ramps stay on the calendar.
+
+Schedules are grouped by their shutdown, detector and HL-LHC start years and each group is evaluated in one pass
+(projection.py) with its live fractions as a batch dimension.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import copy
+import csv
+import sys
+import time
+
+import numpy as np
+
+from configure import configure, model_years
+from projection import METRICS, evaluate
+from utils import time_dependent_value
+
+RESOURCES = ['cpu', 'disk', 'tape']
+PERCENTILES = [10, 50, 90]
+
+
+def sample_choice(spec, nSamples, randomState):
+    """
+    :param spec: a number, or {"values": [...], "weights": [...]}
+    :return: numpy array of nSamples integers
+    """
+
+    if not isinstance(spec, dict):
+        return np.full(nSamples, int(spec))
+    weights = np.array(spec.get('weights', [1] * len(spec['values'])), dtype=np.float64)
+    return np.array(spec['values'])[randomState.choice(len(spec['values']), nSamples, p=weights / weights.sum())]
+
+
+def shifted_era(model, hlStartYear):
+    """
+    :param model: The configuration dictionary
+    :param hlStartYear: first year of HL-LHC running
+    :return: a copy of model with the inputs tied to hl_start_year moved to hlStartYear
+    """
+
+    shifted = copy.deepcopy(model)
+    if 'hl_start_year' not in model:
+        return shifted
+    shift = hlStartYear - model['hl_start_year']
+    shifted['hl_start_year'] = hlStartYear
+    for key in ['trigger_rate', 'live_fraction']:
+        shifted[key] = dict((str(int(year) + shift) if int(year) >= model['hl_start_year'] else year, value)
+                            for year, value in model[key].items())
+    constants = shifted.get('activity_model', {}).get('constants', {})
+    if 'hllhc_mc_year' in constants:
+        constants['hllhc_mc_year'] += shift
+    return shifted
+
+
+def sample_schedules(model, years=None):
+    """
+    :param model: The configuration dictionary with a schedule_model section
+    :param years: Years to consider, defaults to start_year through end_year
+    :return: list of (shutdown years, new detector years, HL-LHC start year) tuples, one per sample, and numpy array
+             of live fractions by sample and year
+    """
+
+    years = years or model_years(model)
+    scheduleModel = model['schedule_model']
+    nSamples = scheduleModel['samples']
+    randomState = np.random.RandomState(scheduleModel.get('seed', 0))
+
+    shutdownYears = [set() for sample in range(nSamples)]
+    detectorYears = [set(scheduleModel.get('new_detector_years', [])) for sample in range(nSamples)]
+    hlStartYears = [model.get('hl_start_year') for sample in range(nSamples)]
+    for shutdown in scheduleModel['shutdowns']:
+        starts = sample_choice(shutdown['start'], nSamples, randomState)
+        lengths = sample_choice(shutdown['length'], nSamples, randomState)
+        for sample in range(nSamples):
+            shutdownYears[sample].update(range(starts[sample], starts[sample] + lengths[sample]))
+            if shutdown.get('new_detector', False):
+                detectorYears[sample].add(int(starts[sample] + lengths[sample]))
+                hlStartYears[sample] = int(starts[sample] + lengths[sample])
+
+    liveModel = scheduleModel.get('live_fraction', {})
+    factors = randomState.normal(1, liveModel.get('sigma', 0), (nSamples, len(years)))
+    poor = randomState.uniform(size=(nSamples, len(years))) < liveModel.get('poor_probability', 0)
+    factors = np.where(poor, factors * liveModel.get('poor_factor', 1), factors)
+    baselines = dict((hlStartYear, [time_dependent_value(year, shifted_era(model, hlStartYear)['live_fraction'])[0]
+                                    for year in years])
+                     for hlStartYear in set(hlStartYears))
+    baseline = np.array([baselines[hlStartYear] for hlStartYear in hlStartYears])
+    liveFractions = np.clip(baseline * factors, liveModel.get('minimum', 0), liveModel.get('maximum', 1))
+
+    patterns = [(sorted(int(year) for year in shutdown), sorted(int(year) for year in detector), hlStartYear)
+                for shutdown, detector, hlStartYear in zip(shutdownYears, detectorYears, hlStartYears)]
+    return patterns, liveFractions
+
+
+def evaluate_schedules(model, years=None):
+    """
+    :param model: The configuration dictionary with a schedule_model section
+    :param years: Years to consider, defaults to start_year through end_year
+    :return: numpy array of the results by sample, year and metric (METRICS), and the number of distinct shutdown,
+             detector and HL-LHC start patterns
+    """
+
+    years = years or model_years(model)
+    patterns, liveFractions = sample_schedules(model, years)
+    groups = collections.defaultdict(list)
+    for sample, pattern in enumerate(patterns):
+        groups[repr(pattern)].append(sample)
+
+    results = np.zeros((len(patterns), len(years), len(METRICS)))
+    for samples in groups.values():
+        shutdownYears, detectorYears, hlStartYear = patterns[samples[0]]
+        scheduled = shifted_era(model, hlStartYear)
+        scheduled['shutdown_years'], scheduled['new_detector_years'] = shutdownYears, detectorYears
+        # Keep the earlier keys for the years before start_year that shutdowns look back to
+        scheduled['live_fraction'].update((str(year), liveFractions[samples, index])
+                                          for index, year in enumerate(years))
+        values = evaluate(scheduled, years).values
+        results[samples] = np.broadcast_to(values, (len(samples),) + values.shape[-2:])
+    return results, len(groups)
+
+
+if __name__ == '__main__':
+    modelNames = None
+    if len(sys.argv) > 1:
+        modelNames = sys.argv[1].split(',')
+    model = configure(modelNames)
+    if 'schedule_model' not in model:
+        sys.exit('No schedule_model section in the configuration, see ScheduleSampling.json')
+
+    YEARS = model_years(model)
+    start = time.time()
+    results, nPatterns = evaluate_schedules(model, YEARS)
+    print('Evaluated %d schedules (%d shutdown, detector and HL-LHC start patterns) in %.2f s' %
+          (len(results), nPatterns, time.time() - start))
+
+    short = dict((resource, results[..., METRICS.index(resource + '_required')] >
+                  results[..., METRICS.index(resource + '_capacity')]) for resource in RESOURCES)
+    short['any'] = short['cpu'] | short['disk'] | short['tape']
+
+    print('\nProbability of a capacity shortfall')
+    print('Year ' + ' '.join('%5s' % resource for resource in RESOURCES + ['any']))
+    for index, year in enumerate(YEARS):
+        print(year, ' '.join('{:5.3f}'.format(short[resource][:, index].mean()) for resource in RESOURCES + ['any']))
+
+    with open('Schedules.csv', 'w') as schedulesFile:
+        writer = csv.writer(schedulesFile)
+        writer.writerow(['year', 'metric'] + ['p%d' % percentile for percentile in PERCENTILES] +
+                        ['shortfall_probability'])
+        for index, year in enumerate(YEARS):
+            for metric in METRICS:
+                values = results[:, index, METRICS.index(metric)]
+                resource = metric.split('_')[0]
+                writer.writerow([year, metric] + list(np.percentile(values, PERCENTILES)) +
+                                [short[resource][:, index].mean() if metric.endswith('_required') else ''])
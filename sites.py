@@ -0,0 +1,187 @@
+#! /usr/bin/env python
+
+
+"""
+Split the CMS-wide requirements among sites
+
+The site table (site_model in SiteModel.json) gives each site a role (T0, T1, T2), a country and a pledge fraction
+per resource. The allocation rules say, per activity or tier, which roles take part. A list of roles shares the
+requirement among all eligible sites by pledge; a dictionary of {role: fraction} first splits the requirement among
+roles and then among the sites of each role by pledge. Requirements without a rule use the "default" rule.
+
+Site capacity is the pledge fraction of the CMS-wide capacity, times an optional per-site growth curve.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+from labeled import LabeledArray
+from utils import time_dependent_value
+
+ROLES = ['T0', 'T1', 'T2']
+
+
+def site_names(model):
+    return sorted(model['site_model']['sites'].keys())
+
+
+def pledges(model, resource):
+    """
+    :param model: The configuration dictionary
+    :param resource: 'cpu', 'disk' or 'tape'
+    :return: numpy array of pledge fractions by site, normalized to 1
+    """
+
+    sites = model['site_model']['sites']
+    pledge = np.array([sites[site]['pledge'].get(resource, 0) for site in site_names(model)], dtype=np.float64)
+    if not pledge.sum() > 0:
+        raise ValueError('No site has a %s pledge' % resource)
+    return pledge / pledge.sum()
+
+
+def allocation_weights(model, resource, activities):
+    """
+    The fraction of each activity allocated to each site
+
+    :param model: The configuration dictionary
+    :param resource: 'cpu', 'disk' or 'tape'
+    :param activities: activities (CPU) or tiers (disk, tape) to allocate
+    :return: numpy array (activity, site), each row sums to 1
+    """
+
+    sites = model['site_model']['sites']
+    rules = model['site_model']['rules'][resource]
+    pledge = pledges(model, resource)
+    roles = np.array([ROLES.index(sites[site]['role']) for site in site_names(model)])
+    isRole = (roles[np.newaxis, :] == np.arange(len(ROLES))[:, np.newaxis])  # (role, site)
+    pledgeByRole = isRole.dot(pledge)  # (role)
+
+    roleFractions = np.zeros((len(activities), len(ROLES)))
+    byRole = np.zeros(len(activities), dtype=bool)
+    for i, activity in enumerate(activities):
+        rule = rules.get(activity, rules['default'])
+        if isinstance(rule, dict):
+            byRole[i] = True
+            for role, fraction in rule.items():
+                if fraction and not pledgeByRole[ROLES.index(role)] > 0:
+                    raise ValueError('No %s site has a %s pledge for the %s share of %s' % (role, resource, fraction,
+                                                                                            activity))
+                roleFractions[i, ROLES.index(role)] = fraction
+            if abs(roleFractions[i].sum() - 1) > 1e-9:
+                raise ValueError('The %s role fractions for %s add up to %s, not 1' % (resource, activity,
+                                                                                       roleFractions[i].sum()))
+        else:
+            for role in rule:
+                roleFractions[i, ROLES.index(role)] = 1
+
+    # Explicit role fractions: split within each role by pledge
+    withinRole = np.where(pledgeByRole > 0, roleFractions / np.where(pledgeByRole > 0, pledgeByRole, 1), 0)
+    explicit = withinRole[:, roles] * pledge[np.newaxis, :]
+
+    # A list of roles: split among all eligible sites by pledge
+    eligible = (roleFractions > 0)[:, roles] * pledge[np.newaxis, :]
+    shared = eligible / np.maximum(eligible.sum(axis=1, keepdims=True), np.finfo(float).tiny)
+
+    weights = np.where(byRole[:, np.newaxis], explicit, shared)
+    unallocated = [activity for activity, total in zip(activities, weights.sum(axis=1)) if total < 1e-9]
+    if unallocated:
+        raise ValueError('No site with a %s pledge can take %s' % (resource, ', '.join(unallocated)))
+    return weights
+
+
+def allocate(model, resource, requirements):
+    """
+    Allocate requirements to sites
+
+    :param model: The configuration dictionary
+    :param resource: 'cpu', 'disk' or 'tape'
+    :param requirements: LabeledArray by year and activity (or tier)
+    :return: LabeledArray by year, activity (or tier) and site
+    """
+
+    years = requirements.labels[requirements.axis('year')]
+    activityAxis = [name for name in requirements.names if name != 'year'][0]
+    activities = requirements.labels[requirements.axis(activityAxis)]
+    weights = allocation_weights(model, resource, activities)
+    values = np.moveaxis(requirements.values, requirements.axis('year'), 0)
+
+    return LabeledArray([('year', years), (activityAxis, activities), ('site', site_names(model))],
+                        values[:, :, np.newaxis] * weights[np.newaxis, :, :])
+
+
+def site_capacity(model, resource, capacity, years):
+    """
+    :param model: The configuration dictionary
+    :param resource: 'cpu', 'disk' or 'tape'
+    :param capacity: CMS-wide capacity by year (from capacity_model)
+    :param years: years matching capacity
+    :return: LabeledArray of capacity by year and site
+    """
+
+    sites = model['site_model']['sites']
+    growth = np.ones((len(years), len(sites)))
+    for column, site in enumerate(site_names(model)):
+        curve = sites[site].get('growth', {}).get(resource)
+        if curve:
+            growth[:, column] = [time_dependent_value(year, curve)[0] or 1.0 for year in years]
+
+    values = np.asarray(capacity)[:, np.newaxis] * pledges(model, resource)[np.newaxis, :] * growth
+    return LabeledArray([('year', years), ('site', site_names(model))], values)
+
+
+def by_attribute(model, bySite, attribute):
+    """
+    Sum a (year, ..., site) LabeledArray over the sites sharing an attribute
+
+    :param model: The configuration dictionary
+    :param bySite: LabeledArray with a site axis
+    :param attribute: 'role' or 'country'
+    :return: LabeledArray with the site axis replaced by the attribute
+    """
+
+    sites = model['site_model']['sites']
+    values = [sites[site][attribute] for site in site_names(model)]
+    groups = sorted(set(values))
+    membership = np.array([[value == group for group in groups] for value in values], dtype=np.float64)
+
+    siteAxis = bySite.axis('site')
+    summed = np.tensordot(bySite.values, membership, axes=([siteAxis], [0]))
+    axes = [axis for axis in bySite.axes if axis[0] != 'site'] + [(attribute, groups)]
+    return LabeledArray(axes, summed)
+
+
+def group_share(model, bySite):
+    """
+    :param model: The configuration dictionary
+    :param bySite: LabeledArray by year and site
+    :return: numpy array by year of the part that falls to the report_group country (e.g. US)
+    """
+
+    byCountry = by_attribute(model, bySite, 'country')
+    group = model['site_model']['report_group']
+    if group not in byCountry.labels[-1]:
+        return np.zeros(bySite.shape[0])
+    return byCountry.select(country=group).values
+
+
+def print_by_role(model, title, required, capacity, scale=1.0):
+    """
+    Print the requirement and capacity of each site role by year
+
+    :param model: The configuration dictionary
+    :param title: Title line for the table
+    :param required: LabeledArray of requirements by year and site
+    :param capacity: LabeledArray of capacity by year and site
+    :param scale: divide the numbers by this
+    """
+
+    requiredByRole = by_attribute(model, required, 'role')
+    capacityByRole = by_attribute(model, capacity, 'role')
+    roles = requiredByRole.labels[-1]
+
+    print(title)
+    print('Year ' + ' '.join(roles) + ' ' + ' '.join(role + 'Cap' for role in roles))
+    for row, year in enumerate(required.labels[required.axis('year')]):
+        print(year, ' '.join('{:04.3f}'.format(value / scale) for value in requiredByRole.values[row]),
+              ' '.join('{:04.3f}'.format(value / scale) for value in capacityByRole.values[row]))
@@ -0,0 +1,216 @@
+#! /usr/bin/env python
+
+
+"""
+Storage model: how much data is produced per year and tier, and how much of it is kept on disk and tape
+
+The retention of each tier is described by a lifecycle curve: the number of copies (versions * replicas) kept as a
+function of the age of the data in years. The curves in storage_model can have any length, the last value holds for
+all later ages. Data does not age while the LHC is in a shutdown. The volume kept in a year is the convolution of
+the production series with the lifecycle curve.
+
+Arrays are ordered with the labeled axes last so that parameters given as arrays (a batch of model variations, see
+derivatives.py) broadcast through as leading dimensions.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+from configure import in_shutdown, mc_event_model, model_years, run_model
+from labeled import LabeledArray, stack_trailing
+from performance import performance_by_year
+from utils import time_dependent_value
+
+DATA_TYPES = ['data', 'mc']
+
+# Above this many years the convolution is done with FFTs rather than directly
+FFT_THRESHOLD = 64
+
+
+def data_produced(model, years=None):
+    """
+    :param model: The configuration dictionary
+    :param years: Years to consider, defaults to start_year through end_year
+    :return: LabeledArray of bytes produced by producedYear, dataType and tier without versions or replicas
+    """
+
+    years = years or model_years(model)
+    tiers = list(model['tier_sizes'].keys())
+    produced = LabeledArray([('producedYear', years), ('dataType', DATA_TYPES), ('tier', tiers)])
+
+    for year in years:
+        mcEvents = mc_event_model(model, year)
+        for tier in tiers:
+            if tier not in model['mc_only_tiers']:
+                dummyCPU, tierSize = performance_by_year(model, year, tier, data_type='data')
+                produced.add(tierSize * run_model(model, year, data_type='data').events,
+                             producedYear=year, dataType='data', tier=tier)
+            if tier not in model['data_only_tiers']:
+                for kind, events in mcEvents.items():
+                    dummyCPU, tierSize = performance_by_year(model, year, tier, data_type='mc', kind=kind)
+                    produced.add(tierSize * events, producedYear=year, dataType='mc', tier=tier)
+
+    return produced
+
+
+def lifecycle_curve(values, length):
+    """
+    Stretch or cut a list of values by age to the given length, repeating the last value
+
+    :param values: list of values, the first for the year the data is produced
+    :param length: number of ages needed
+    :return: numpy array of length values
+    """
+
+    values = list(values) or [0]
+    values = values[:length] + [values[-1]] * max(length - len(values), 0)
+    curve = stack_trailing(values)
+    return curve.astype(np.result_type(curve, np.float64))
+
+
+def lifecycle_kernel(model, tier, medium, length):
+    """
+    Number of copies of a tier kept on a medium as a function of age
+
+    On disk this is versions * disk_replicas for each age. On tape it is tape_versions * tape_replicas if
+    tape_versions is given for the tier, otherwise tape_replicas of a single version.
+
+    :param model: The configuration dictionary
+    :param tier: Data tier
+    :param medium: 'disk' or 'tape'
+    :param length: Number of years (ages) to evaluate
+    :return: numpy array of copies for age 0 to length - 1 (the last axis)
+    """
+
+    storageModel = model['storage_model']
+    if medium == 'disk':
+        versions = lifecycle_curve(storageModel['versions'][tier], length)
+        return versions * lifecycle_curve(storageModel['disk_replicas'][tier], length)
+    elif medium == 'tape':
+        replicas = lifecycle_curve(storageModel['tape_replicas'][tier], length)
+        if tier in storageModel.get('tape_versions', {}):
+            return lifecycle_curve(storageModel['tape_versions'][tier], length) * replicas
+        return replicas
+    raise ValueError('Unknown storage medium %r' % medium)
+
+
+def last_running_index(model, years):
+    """
+    :param model: The configuration dictionary
+    :param years: Consecutive years being modeled
+    :return: numpy array with, for each year, the index in years of the last year not in shutdown (-1 if before)
+    """
+
+    return np.array([in_shutdown(model, year)[1] - years[0] for year in years])
+
+
+def convolve_years(series, kernel):
+    """
+    Causal convolution along the last (year) axis, truncated to the length of the series:
+    result[y] = sum over p <= y of series[p] * kernel[y - p]. Leading axes broadcast.
+
+    :param series: array (..., years)
+    :param kernel: array (..., years)
+    :return: array (..., years)
+    """
+
+    dtype = np.result_type(series, kernel, np.float64)
+    series = np.asarray(series, dtype=dtype)
+    kernel = np.asarray(kernel, dtype=dtype)
+    nYears = series.shape[-1]
+
+    if nYears > FFT_THRESHOLD:
+        nFFT = 1 << (2 * nYears - 1).bit_length()
+        if np.iscomplexobj(series):
+            spectrum = np.fft.fft(series, nFFT, axis=-1) * np.fft.fft(kernel, nFFT, axis=-1)
+            return np.fft.ifft(spectrum, nFFT, axis=-1)[..., :nYears]
+        spectrum = np.fft.rfft(series, nFFT, axis=-1) * np.fft.rfft(kernel, nFFT, axis=-1)
+        return np.fft.irfft(spectrum, nFFT, axis=-1)[..., :nYears]
+
+    shape = np.broadcast(series, kernel).shape
+    result = np.zeros(shape, dtype=dtype)
+    for age in range(nYears):
+        result[..., age:] += kernel[..., age:age + 1] * series[..., :nYears - age]
+    return result
+
+
+def data_on_media(model, produced, medium):
+    """
+    Data kept on disk or tape per year, from the convolution of production with the lifecycle kernels
+
+    Data produced in a shutdown, or aged during one, is counted at the age it had in the last running year.
+
+    :param model: The configuration dictionary
+    :param produced: LabeledArray from data_produced
+    :param medium: 'disk' or 'tape'
+    :return: LabeledArray of bytes by year, dataType and tier
+    """
+
+    years = produced.labels[produced.axis('producedYear')]
+    tiers = produced.labels[produced.axis('tier')]
+    dataTypes = produced.labels[produced.axis('dataType')]
+    nYears = len(years)
+
+    kernel = stack_trailing([lifecycle_kernel(model, tier, medium, nYears) for tier in tiers], axis=-2)  # (tier, age)
+    series = np.moveaxis(produced.values, -3, -1)  # (dataType, tier, producedYear)
+    kept = convolve_years(series, kernel[..., np.newaxis, :, :])
+
+    # In shutdown years, use what was kept in the last running year plus everything produced since at age 0
+    lastRunning = last_running_index(model, years)
+    cumulative = np.cumsum(series, axis=-1)
+    keptLast = np.where(lastRunning >= 0, kept[..., np.maximum(lastRunning, 0)], 0)
+    producedSince = cumulative - np.where(lastRunning >= 0, cumulative[..., np.maximum(lastRunning, 0)], 0)
+    kept = keptLast + kernel[..., np.newaxis, :, :1] * producedSince
+
+    return LabeledArray([('year', years), ('dataType', dataTypes), ('tier', tiers)], np.moveaxis(kept, -1, -3))
+
+
+def data_on_media_by_cohort(model, produced, medium):
+    """
+    The same as data_on_media but keeping the year the data was produced
+
+    :param model: The configuration dictionary
+    :param produced: LabeledArray from data_produced
+    :param medium: 'disk' or 'tape'
+    :return: LabeledArray of bytes by year, producedYear, dataType and tier
+    """
+
+    years = produced.labels[produced.axis('producedYear')]
+    tiers = produced.labels[produced.axis('tier')]
+    dataTypes = produced.labels[produced.axis('dataType')]
+    nYears = len(years)
+
+    kernel = stack_trailing([lifecycle_kernel(model, tier, medium, nYears) for tier in tiers], axis=-2)  # (tier, age)
+
+    # Age of the data produced in each year, frozen during shutdowns. -1 for data not produced yet
+    lastRunning = last_running_index(model, years)
+    producedIndex = np.arange(nYears)
+    age = np.maximum(lastRunning[:, np.newaxis] - producedIndex[np.newaxis, :], 0)
+    age = np.where(producedIndex[np.newaxis, :] <= producedIndex[:, np.newaxis], age, -1)
+
+    copies = np.where(age >= 0, kernel[..., np.maximum(age, 0)], 0)  # (tier, year, producedYear)
+    copies = np.moveaxis(copies, -3, -1)[..., np.newaxis, :]  # (year, producedYear, 1, tier)
+    kept = produced.values[..., np.newaxis, :, :, :] * copies
+
+    return LabeledArray([('year', years), ('producedYear', years), ('dataType', dataTypes), ('tier', tiers)], kept)
+
+
+def static_data(model, medium, years=None):
+    """
+    Data that does not follow the production model (Run 1 & 2, operations space)
+
+    :param model: The configuration dictionary
+    :param medium: 'disk' or 'tape'
+    :param years: Years to consider, defaults to start_year through end_year
+    :return: LabeledArray of bytes by year, producedYear and tier
+    """
+
+    years = years or model_years(model)
+    spaces = model['static_' + medium]
+    static = LabeledArray([('year', years), ('producedYear', years), ('tier', sorted(spaces.keys()))])
+    for year in years:
+        for tier, values in spaces.items():
+            size, producedYear = time_dependent_value(year=year, values=values)
+            static.add(size, year=year, producedYear=producedYear, tier=tier)
+    return static
@@ -0,0 +1,193 @@
+#! /usr/bin/env python
+
+"""
+Usage: ./sweep.py scenario1.json scenario2.json,other.json ... [--output sweep.dat] [--check]
+
+Evaluate a sweep of scenarios that share their parameters up to some year, such as variants of the HL-LHC
+assumptions. Arguments are comma separated lists of configuration files as for scenarios.py.
+
+For each scenario, find the first year in which its per year inputs (projection.compile_inputs: events, MC fractions,
+shutdowns, tier sizes, CPU times and software improvements) can differ from those of a scenario already evaluated.
+The inputs of the earlier years are then taken from that scenario and only the later years are computed. The
+activity formulas, storage convolutions and capacity are whole array operations and are redone over all years.
+
+The divergence is found from INPUT_LOOKUPS, the parameters compile_inputs reads for each year, which are cheap to
+look up. They need to follow cpu_series and data_produced. --check evaluates every scenario from scratch as well and
+reports any difference.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import time
+
+import numpy as np
+
+from configure import configure, in_shutdown, model_years, run_model
+from performance import performance_kind
+from projection import METRICS, compile_inputs, evaluate
+from resultstore import ResultStore
+from utils import interpolate_value, time_dependent_value
+
+
+def mc_kinds(model, year):
+    return sorted(set(performance_kind(year, kind, model.get('hl_start_year'))
+                      for kind in ['2017', '2026'] + list(model['mc_evolution'])))
+
+
+def event_lookup(model, year):
+    # mc_event_model also uses the events of the last running year and looks ahead to those of the MC years
+    events = [run_model(model, year).events, run_model(model, in_shutdown(model, year)[1]).events]
+    return events + [run_model(model, int(mcType)).events for mcType in sorted(model['mc_evolution'])
+                     if int(mcType) > year]
+
+
+def shutdown_lookup(model, year):
+    return in_shutdown(model, year), in_shutdown(model, year - 1)[0], year in model['new_detector_years']
+
+
+def mc_fraction_lookup(model, year):
+    return [(mcType, interpolate_value(ramp, year)) for mcType, ramp in sorted(model['mc_evolution'].items())]
+
+
+def software_lookup(model, year):
+    # The improvement is the product of the ramp since start_year, so it first differs where the ramp does
+    return [(kind, interpolate_value(ramp, year))
+            for kind, ramp in sorted(model['improvement_factors']['software_by_kind'].items())]
+
+
+def performance_lookup(model, year):
+    kinds = {'data': [performance_kind(year, hlStartYear=model.get('hl_start_year'))], 'mc': mc_kinds(model, year)}
+    sizes = [(tier, [time_dependent_value(kind, values)[0] for kind in kinds['data'] + kinds['mc']])
+             for tier, values in model['tier_sizes'].items()]
+    times = [(dataType, tier, [time_dependent_value(kind, values)[0] for kind in kinds[dataType]])
+             for dataType in sorted(kinds) for tier, values in sorted(model['cpu_time'].get(dataType, {}).items())]
+    return sizes, times, sorted(model['mc_only_tiers']), sorted(model['data_only_tiers'])
+
+
+# (configuration keys, function of model and year): everything compile_inputs reads for one year
+INPUT_LOOKUPS = [
+    (['trigger_rate', 'live_fraction', 'shutdown_years', 'mc_evolution'], event_lookup),
+    (['shutdown_years', 'new_detector_years'], shutdown_lookup),
+    (['mc_evolution'], mc_fraction_lookup),
+    (['improvement_factors'], software_lookup),
+    (['tier_sizes', 'cpu_time', 'mc_evolution', 'mc_only_tiers', 'data_only_tiers', 'hl_start_year'],
+     performance_lookup),
+]
+
+MISSING = object()
+
+
+def same(value, other):
+    try:
+        return bool(value == other)
+    except ValueError:  # Arrays, never shared
+        return False
+
+
+def lookup_value(lookup, model, year):
+    try:
+        return lookup(model, year)
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
+        return MISSING
+
+
+def divergence_year(reference, model, years=None):
+    """
+    :param reference: The configuration dictionary of a scenario already evaluated
+    :param model: The configuration dictionary of the scenario to evaluate
+    :param years: Years of model, defaults to start_year through end_year
+    :return: the first year in which the inputs of model may differ from those of reference, or the year after the
+             last year both cover
+    """
+
+    years = years or model_years(model)
+    referenceYears = model_years(reference)
+    if reference['start_year'] != model['start_year']:
+        return years[0]
+
+    common = [year for year in years if year in referenceYears]
+    lookups = [lookup for keys, lookup in INPUT_LOOKUPS
+               if not all(same(reference.get(key, MISSING), model.get(key, MISSING)) for key in keys)]
+    for year in common:
+        for lookup in lookups:
+            value = lookup_value(lookup, model, year)
+            if value is MISSING or not same(lookup_value(lookup, reference, year), value):
+                return year
+    return common[-1] + 1 if common else years[0]
+
+
+def evaluate_sweep(models):
+    """
+    Evaluate scenarios in order, each branching from the earlier scenario it shares the most years with
+
+    :param models: list of configuration dictionaries
+    :return: list of LabeledArrays by year and metric, and list of (index of the scenario branched from or None,
+             first year computed) per scenario
+    """
+
+    compiled = []
+    results = []
+    branches = []
+    for model in models:
+        years = model_years(model)
+        branch = (None, years[0])
+        for index, (other, inputs) in enumerate(compiled):
+            divergence = divergence_year(other, model, years)
+            if divergence > branch[1]:
+                branch = (index, divergence)
+
+        prefix = compiled[branch[0]][1] if branch[0] is not None else None
+        inputs = compile_inputs(model, years, prefix, branch[1])
+        compiled.append((model, inputs))
+        results.append(evaluate(model, years, inputs))
+        branches.append(branch)
+    return results, branches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluate scenarios sharing the years before they diverge')
+    parser.add_argument('scenarios', nargs='+', help='comma separated lists of configuration files')
+    parser.add_argument('--output', default='sweep.dat')
+    parser.add_argument('--check', action='store_true', help='also evaluate every scenario from scratch')
+    args = parser.parse_args()
+
+    models = [configure(scenario.split(',')) for scenario in args.scenarios]
+
+    start = time.time()
+    results, branches = evaluate_sweep(models)
+    elapsed = time.time() - start
+
+    years = set()
+    for model in models:
+        years.update(model_years(model))
+    store = ResultStore.create(args.output, args.scenarios, list(range(min(years), max(years) + 1)), METRICS,
+                               metadata={'branches': dict((scenario, branch) for scenario, branch
+                                                          in zip(args.scenarios, branches))})
+    for scenario, result in zip(args.scenarios, results):
+        store.write(scenario, result)
+    store.flush()
+
+    sharedYears = 0
+    for scenario, model, (index, divergence) in zip(args.scenarios, models, branches):
+        modelYears = model_years(model)
+        shared = len([year for year in modelYears if year < divergence])
+        sharedYears += shared
+        if index is None:
+            print('%s: all %d years computed' % (scenario, len(modelYears)))
+        else:
+            print('%s: years before %d (%d of %d) shared with %s' %
+                  (scenario, divergence, shared, len(modelYears), args.scenarios[index]))
+    totalYears = sum(len(model_years(model)) for model in models)
+    print('Evaluated %d scenarios in %.3f s, %d of %d scenario years shared' %
+          (len(models), elapsed, sharedYears, totalYears))
+
+    if args.check:
+        start = time.time()
+        worst = 0
+        for model, result in zip(models, results):
+            scratch = evaluate(model)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                difference = np.abs(result.values - scratch.values) / np.abs(scratch.values)
+            worst = max(worst, np.nanmax(np.where(scratch.values == result.values, 0, difference)))
+        print('From scratch in %.3f s, largest relative difference %.3g' % (time.time() - start, worst))